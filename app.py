@@ -1,8 +1,15 @@
 import os
+import hashlib
 import logging
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime
 
+class Base(DeclarativeBase):
+    pass
+
+db = SQLAlchemy(model_class=Base)
 app = Flask(__name__)
 
 # Config
@@ -13,95 +20,271 @@ app.config["WP_API_URL"] = os.environ.get("WP_API_URL")
 app.config["WP_API_USER"] = os.environ.get("WP_API_USER")
 app.config["WP_API_KEY"] = os.environ.get("WP_API_KEY")
 app.config["WP_SITE_URL"] = os.environ.get("WP_SITE_URL")
+app.config["GOOGLE_MAX_WORKERS"] = int(os.environ.get("GOOGLE_MAX_WORKERS", 4))
+app.config["WP_MAX_WORKERS"] = int(os.environ.get("WP_MAX_WORKERS", 2))
+app.config["WP_MAX_RETRIES"] = int(os.environ.get("WP_MAX_RETRIES", 4))
+app.config["WP_TIMEOUT"] = float(os.environ.get("WP_TIMEOUT", 30))
+app.config["WP_BATCH_POSTS"] = os.environ.get("WP_BATCH_POSTS", "true").lower() == "true"
+app.config["SHEETS_META_TTL"] = float(os.environ.get("SHEETS_META_TTL", 300))
+app.config["SHEETS_WRITE_BATCH_SIZE"] = int(os.environ.get("SHEETS_WRITE_BATCH_SIZE", 50))
+app.config["SHEETS_WRITE_FLUSH_SECONDS"] = float(os.environ.get("SHEETS_WRITE_FLUSH_SECONDS", 10))
+app.config["DOC_CACHE_ENABLED"] = os.environ.get("DOC_CACHE_ENABLED", "true").lower() == "true"
+app.config["DOC_CACHE_DIR"] = os.environ.get("DOC_CACHE_DIR", "cache/docs")
+app.config["DOC_CACHE_MAX_BYTES"] = int(os.environ.get("DOC_CACHE_MAX_BYTES", 100 * 1024 * 1024))
+app.config["IMAGE_SPOOL_BYTES"] = int(os.environ.get("IMAGE_SPOOL_BYTES", 5 * 1024 * 1024))
+app.config["MEDIA_INDEX_VERIFY_SECONDS"] = int(os.environ.get("MEDIA_INDEX_VERIFY_SECONDS", 7 * 24 * 3600))
+app.config["IMAGE_OPTIMIZE"] = os.environ.get("IMAGE_OPTIMIZE", "false").lower() == "true"
+app.config["IMAGE_MAX_WIDTH"] = int(os.environ.get("IMAGE_MAX_WIDTH", 1600))
+app.config["IMAGE_FORMAT"] = os.environ.get("IMAGE_FORMAT", "webp")
+app.config["IMAGE_QUALITY"] = int(os.environ.get("IMAGE_QUALITY", 82))
+app.config["IMAGE_OPTIMIZE_WORKERS"] = int(os.environ.get("IMAGE_OPTIMIZE_WORKERS", 2))
+app.config["IMAGE_CACHE_DIR"] = os.environ.get("IMAGE_CACHE_DIR", "cache/images")
+app.config["IMAGE_CACHE_MAX_BYTES"] = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+app.config["DOCS_PREFETCH_SIZE"] = int(os.environ.get("DOCS_PREFETCH_SIZE", 50))
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 1))
+app.config["JOB_STALE_SECONDS"] = int(os.environ.get("JOB_STALE_SECONDS", 600))
+app.config["FANOUT_TARGETS"] = os.environ.get("FANOUT_TARGETS")
+app.config["FANOUT_WORKERS"] = int(os.environ.get("FANOUT_WORKERS", 4))
+app.config["FANOUT_SHARD_ROWS"] = int(os.environ.get("FANOUT_SHARD_ROWS", 200))
+app.config["FANOUT_LEASE_SECONDS"] = int(os.environ.get("FANOUT_LEASE_SECONDS", 600))
+app.config["FANOUT_MAX_ATTEMPTS"] = int(os.environ.get("FANOUT_MAX_ATTEMPTS", 3))
+app.config["PUBLISH_MODE"] = os.environ.get("PUBLISH_MODE", "future")
+app.config["PUBLISH_WINDOWS"] = os.environ.get("PUBLISH_WINDOWS", "08:00-18:00")
+app.config["PUBLISH_MAX_PER_DAY"] = int(os.environ.get("PUBLISH_MAX_PER_DAY", 10))
+app.config["PUBLISH_MAX_PER_HOUR"] = int(os.environ.get("PUBLISH_MAX_PER_HOUR", 2))
+app.config["PUBLISH_RELEASE_BATCH"] = int(os.environ.get("PUBLISH_RELEASE_BATCH", 10))
+app.config["RATE_LIMIT_ENABLED"] = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+app.config["RATE_SHEETS_READ"] = float(os.environ.get("RATE_SHEETS_READ", 1))
+app.config["RATE_SHEETS_WRITE"] = float(os.environ.get("RATE_SHEETS_WRITE", 1))
+app.config["RATE_DOCS"] = float(os.environ.get("RATE_DOCS", 5))
+app.config["RATE_DRIVE"] = float(os.environ.get("RATE_DRIVE", 20))
+app.config["RATE_WORDPRESS"] = float(os.environ.get("RATE_WORDPRESS", 5))
+app.config["PROFILE_RUNS"] = os.environ.get("PROFILE_RUNS", "false").lower() == "true"
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", "profiles")
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///uploader.db")
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_recycle": 300, "pool_pre_ping": True}
+db.init_app(app)
+
+from utils.rate_limit import limiter, DEFAULT_LIMITS
+limiter.configure({api: app.config[f"RATE_{api.upper()}"] for api in DEFAULT_LIMITS}, enabled=app.config["RATE_LIMIT_ENABLED"])
+
+with app.app_context():
+    import models
+    db.create_all()
 
 @app.route('/')
 def dashboard():
     return render_template('dashboard.html')
 
+def _conditional_json(key, build):
+    # ETag from a cheap key (log stamp, counts, query) so an unchanged dashboard gets a 304
+    # without the log being read; no-cache makes the browser revalidate every time
+    etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/status')
 def api_status():
+    from utils.run_log import run_log
+    from utils.clients import clients
+    from models import ScheduledPost
     try:
-        log_path = "logs/runtime.log"
-        if not os.path.exists(log_path):
-            return jsonify({
-                'pending_posts': 0,
-                'published_today': 0,
-                'error_count': 0,
-                'recent_activity': []
-            })
-
-        with open(log_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()[-10:]
-
-        recent_activities = []
-        for line in lines:
-            parts = line.strip().split(" | ")
-            if len(parts) == 4:
-                recent_activities.append({
-                    'timestamp': parts[0],
-                    'action': parts[1],
-                    'status': parts[2],
-                    'details': parts[3]
-                })
-
-        return jsonify({
-            'pending_posts': 0,
-            'published_today': 0,
-            'error_count': sum(1 for log in recent_activities if log['status'].lower() == 'error'),
-            'recent_activity': recent_activities
-        })
+        now = datetime.now()
+        pending_posts = ScheduledPost.query.filter(
+            ScheduledPost.state.in_(('reserved', 'scheduled')), ScheduledPost.publish_at > now).count()
+        published_today = ScheduledPost.query.filter(
+            ScheduledPost.state.in_(('scheduled', 'released')),
+            ScheduledPost.publish_at.between(now.replace(hour=0, minute=0, second=0, microsecond=0), now)).count()
+
+        def build():
+            recent_activities = [{
+                'timestamp': event['time'],
+                'action': event['action'],
+                'status': event['status'],
+                'details': event['details']
+            } for event in run_log.tail(10)]
+            return {
+                'pending_posts': pending_posts,
+                'published_today': published_today,
+                'error_count': sum(1 for log in recent_activities if log['status'].lower() == 'error'),
+                'recent_activity': recent_activities,
+                'startup_timings': clients.startup_timings
+            }
+
+        return _conditional_json((run_log.stamp(), pending_posts, published_today, repr(clients.startup_timings)), build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/logs')
 def get_logs():
+    from utils.run_log import run_log
     try:
-        with open("logs/runtime.log", "r", encoding="utf-8") as f:
-            lines = f.readlines()[-50:]
-        logs = []
-        for line in lines:
-            parts = line.strip().split(" | ")
-            if len(parts) == 4:
-                logs.append({
-                    "time": parts[0],
-                    "action": parts[1],
-                    "status": parts[2],
-                    "details": parts[3]
-                })
-        return jsonify(logs)
+        def build():
+            events = run_log.tail(
+                limit=min(request.args.get('limit', 50, type=int), 1000),
+                row=request.args.get('row', type=int),
+                status=request.args.get('status'),
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+            )
+            return [{
+                "time": event['time'],
+                "action": event['action'],
+                "status": event['status'],
+                "details": event['details'],
+                "row": event.get('row')
+            } for event in events]
+
+        return _conditional_json((run_log.stamp(), sorted(request.args.items())), build)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/events')
+def event_stream():
+    # Server-Sent Events: 'log' (run log lines), 'row' (row outcomes) and 'job' (job state and progress)
+    from utils.events import events
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(events.stream(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/process/rows', methods=['POST'])
 def process_rows():
-    from utils.processor import run_specific_rows
+    from utils.processor import PROCESS_MODES
     try:
         start_row = request.args.get('start', type=int)
         end_row = request.args.get('end', type=int)
-        logging.info(f"📥 /api/process/rows called with: start={start_row}, end={end_row}")
+        mode = request.args.get('mode', 'sequential')
+        logging.info(f"📥 /api/process/rows called with: start={start_row}, end={end_row}, mode={mode}")
 
         if start_row is None or end_row is None:
             return jsonify({'success': False, 'error': 'Missing required parameters'}), 400
         if start_row > end_row:
             return jsonify({'success': False, 'error': 'Invalid row range'}), 400
+        if mode not in PROCESS_MODES:
+            return jsonify({'success': False, 'error': f'Invalid mode: {mode}'}), 400
 
-        run_specific_rows(start_row, end_row)
-        return jsonify({'success': True, 'message': f'Processing rows {start_row} to {end_row}'})
+        return _submit_rows_job(start_row, end_row, mode, request.args.get('force', 'false').lower() in ('1', 'true'))
     except Exception as e:
         logging.error(f"❌ Error in process_rows: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/process/rows/<int:start_row>/<int:end_row>', methods=['POST'])
 def process_specific_rows(start_row, end_row):
-    from utils.processor import run_specific_rows
+    from utils.processor import PROCESS_MODES
     try:
-        logging.info(f"📥 /api/process/rows/{start_row}/{end_row} called")
-        run_specific_rows(start_row, end_row)
-        return jsonify({'success': True, 'message': f'Processing rows {start_row} to {end_row}'})
+        mode = request.args.get('mode', 'sequential')
+        logging.info(f"📥 /api/process/rows/{start_row}/{end_row} called with mode={mode}")
+        if start_row > end_row:
+            return jsonify({'success': False, 'error': 'Invalid row range'}), 400
+        if mode not in PROCESS_MODES:
+            return jsonify({'success': False, 'error': f'Invalid mode: {mode}'}), 400
+        return _submit_rows_job(start_row, end_row, mode, request.args.get('force', 'false').lower() in ('1', 'true'))
     except Exception as e:
         logging.error(f"❌ Error in process_specific_rows: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _submit_rows_job(start_row, end_row, mode, force=False):
+    from utils.jobs import submit_job, JobConflict
+    try:
+        job, created = submit_job(start_row, end_row, mode, force)
+    except JobConflict as e:
+        return jsonify({'success': False, 'error': str(e), 'job': e.job.to_dict()}), 409
+    message = f'Queued rows {start_row} to {end_row}' if created else f'Rows {start_row} to {end_row} are already {job.state}'
+    return jsonify({'success': True, 'message': message, 'job_id': job.id, 'job': job.to_dict()}), 202 if created else 200
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    from utils.jobs import get_job_status
+    job = get_job_status(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    from utils.jobs import request_cancel
+    job = request_cancel(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/fanout', methods=['POST'])
+def start_fanout():
+    from utils.fanout import submit_run, FanoutConflict
+    from utils.processor import PROCESS_MODES
+    try:
+        mode = request.args.get('mode', 'concurrent')
+        if mode not in PROCESS_MODES:
+            return jsonify({'success': False, 'error': f'Invalid mode: {mode}'}), 400
+        names = [n.strip() for n in request.args.get('targets', '').split(',') if n.strip()]
+        logging.info(f"📥 /api/fanout called with: targets={names or 'all'}, mode={mode}")
+        run = submit_run(names, mode, request.args.get('force', 'false').lower() in ('1', 'true'))
+        return jsonify({'success': True, 'run_id': run['run_id'], 'run': run}), 202
+    except FanoutConflict as e:
+        return jsonify({'success': False, 'error': str(e), 'run_id': e.run_id}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"❌ Error in start_fanout: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/fanout/targets')
+def get_fanout_targets():
+    from utils.targets import load_targets
+    try:
+        return jsonify([target.to_dict() for target in load_targets(app.config).values()])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/fanout/<run_id>')
+def get_fanout_run(run_id):
+    from utils.fanout import run_status, shard_queue
+    shard_queue.ensure_started()
+    run = run_status(run_id, include_shards=request.args.get('shards', 'false').lower() in ('1', 'true'))
+    if not run:
+        return jsonify({'success': False, 'error': 'Run not found'}), 404
+    return jsonify(run)
+
+@app.route('/api/fanout/<run_id>/cancel', methods=['POST'])
+def cancel_fanout_run(run_id):
+    from utils.fanout import cancel_run
+    run = cancel_run(run_id)
+    if not run:
+        return jsonify({'success': False, 'error': 'Run not found'}), 404
+    return jsonify({'success': True, 'run': run})
+
+@app.route('/api/rate-limits')
+def get_rate_limits():
+    from utils.rate_limit import limiter
+    return jsonify({'enabled': limiter.enabled, 'buckets': limiter.stats()})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    from utils.metrics import metrics
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/rows')
+def get_row_spans():
+    from utils.metrics import metrics
+    return jsonify(metrics.spans(min(request.args.get('limit', 50, type=int), 500)))
+
+@app.route('/api/schedule')
+def get_schedule():
+    from models import ScheduledPost
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        query = ScheduledPost.query.order_by(ScheduledPost.publish_at)
+        if request.args.get('all', 'false').lower() not in ('1', 'true'):
+            query = query.filter(ScheduledPost.state.in_(('reserved', 'scheduled')), ScheduledPost.publish_at > datetime.now())
+        return jsonify([entry.to_dict() for entry in query.limit(limit)])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('base.html', error="Page not found"), 404
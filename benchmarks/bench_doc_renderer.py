@@ -0,0 +1,118 @@
+"""Micro-benchmark for utils.doc_renderer.
+
+Checks every fixture in fixtures/docs against its recorded .html output, then times the
+renderer on a ~50 page document stitched together from those fixtures.
+
+    python benchmarks/bench_doc_renderer.py [--pages 50] [--repeat 20]
+"""
+import argparse, copy, glob, json, os, sys, time, tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.doc_renderer import render_document
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'docs')
+# Roughly what fits on one printed page of a Google Doc
+WORDS_PER_PAGE = 500
+
+def load_fixtures():
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, '*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            fixtures.append((os.path.basename(path), path[:-5] + '.html', json.load(f)))
+    return fixtures
+
+def check_fixtures(fixtures):
+    failed = 0
+    for name, expected_path, document in fixtures:
+        html = render_document(document)
+        try:
+            with open(expected_path, 'r', encoding='utf-8') as f:
+                expected = f.read().strip()
+        except OSError:
+            print(f"⚠️ {name}: no recorded output")
+            continue
+        if html != expected:
+            failed += 1
+            print(f"❌ {name}: output differs from {os.path.basename(expected_path)}")
+        else:
+            print(f"✅ {name}")
+    return failed
+
+def count_words(content):
+    words = 0
+    for element in content:
+        for elem in element.get('paragraph', {}).get('elements', []):
+            words += len(elem.get('textRun', {}).get('content', '').split())
+        for row in element.get('table', {}).get('tableRows', []):
+            for cell in row.get('tableCells', []):
+                words += count_words(cell.get('content', []))
+    return words
+
+def build_document(fixtures, pages):
+    # Repeats the fixture bodies (lists, tables, images, styled runs) until the page budget is met
+    document = {'documentId': 'bench', 'body': {'content': []}, 'lists': {}, 'inlineObjects': {}}
+    content = document['body']['content']
+    words, n = 0, 0
+    while words < pages * WORDS_PER_PAGE:
+        for _, _, fixture in fixtures:
+            suffix = f".{n}"
+            for list_id, props in fixture.get('lists', {}).items():
+                document['lists'][list_id + suffix] = props
+            for object_id, props in fixture.get('inlineObjects', {}).items():
+                document['inlineObjects'][object_id + suffix] = props
+            body = copy.deepcopy(fixture['body']['content'])
+            _rename_ids(body, suffix)
+            content.extend(body)
+            words += count_words(body)
+            n += 1
+    return document, words
+
+def _rename_ids(content, suffix):
+    for element in content:
+        para = element.get('paragraph')
+        if para:
+            if 'bullet' in para:
+                para['bullet']['listId'] += suffix
+            for elem in para.get('elements', []):
+                if 'inlineObjectElement' in elem:
+                    elem['inlineObjectElement']['inlineObjectId'] += suffix
+        for row in element.get('table', {}).get('tableRows', []):
+            for cell in row.get('tableCells', []):
+                _rename_ids(cell.get('content', []), suffix)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    if check_fixtures(fixtures):
+        sys.exit(1)
+
+    document, words = build_document(fixtures, args.pages)
+    elements = len(document['body']['content'])
+    render_document(document)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        html = render_document(document)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    tracemalloc.start()
+    render_document(document)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best, median = timings[0], timings[len(timings) // 2]
+    print(f"📄 {args.pages} pages: {words} words, {elements} structural elements, {len(html)} chars of HTML")
+    print(f"⏱ best {best * 1000:.2f}ms, median {median * 1000:.2f}ms over {args.repeat} runs")
+    print(f"🚀 {elements / median:,.0f} elements/s, {len(html) / median / 1024 / 1024:.1f} MB/s of HTML")
+    print(f"🧠 peak {peak / 1024:.0f} KiB allocated while rendering")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""End-to-end throughput benchmark for ArticleProcessor.run_processor.
+
+Runs the real processor (Google API client, WordPress client, database, scheduler) against the
+in-process fakes in benchmarks/fakes.py, over synthetic sheets of each requested size, and reports
+rows/s, p50/p95/p99 per-row latency, mean time per stage, request counts per API and peak memory.
+
+    python benchmarks/bench_pipeline.py [--rows 10,100,1000] [--mode concurrent]
+        [--latency 20] [--api-latency docs=80,wordpress=150] [--error-rate 0.01]
+        [--doc-pages 3] [--image-kb 500] [--json results.json] [--baseline results.json]
+
+Latencies are in milliseconds. Every run starts from an empty database and doc cache, so all rows
+are new posts. Rate limiting is off unless --rate-limit is given: the fakes have no quotas, and the
+default rates would otherwise be what gets measured. With --baseline, exits 1 if throughput for any
+size drops more than --tolerance below the recorded run.
+"""
+import argparse, json, os, shutil, sys, tempfile, threading, time, tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SPREADSHEET_ID = 'bench-sheet'
+SHEET_TITLE = 'Sheet1'
+HEADERS = ['Title', 'קישור למאמר', 'תאריך פרסום', 'קישור לתמונה', 'שם תמונה', 'סטטוס', 'POST URL']
+
+def parse_api_values(spec, scale=1.0):
+    # "docs=80,wordpress=150" -> {'docs': 0.08, 'wordpress': 0.15} with scale=0.001
+    values = {}
+    for part in filter(None, (spec or '').split(',')):
+        api, _, value = part.partition('=')
+        values[api.strip()] = float(value) * scale
+    return values
+
+def synthetic_rows(count, per_day):
+    first = date.today() + timedelta(days=1)
+    return [[
+        f"Benchmark article {i}",
+        f"https://docs.google.com/document/d/doc{i}/edit",
+        (first + timedelta(days=i // per_day)).isoformat(),
+        f"https://drive.google.com/file/d/img{i}/view",
+        f"image-{i}.png",
+        '',
+        '',
+    ] for i in range(count)]
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+class BenchTracker:
+    # Progress tracker interface used by the job queue; records when each row finished
+    def __init__(self):
+        self.finished = {}
+        self.outcomes = {}
+        self._lock = threading.Lock()
+
+    def start(self, total):
+        self.total = total
+
+    def row_done(self, i, outcome):
+        with self._lock:
+            self.finished[i] = time.perf_counter()
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def cancelled(self):
+        return False
+
+def configure_environment(workdir, google, wordpress, args):
+    # app.py reads its config from the environment at import time, so this has to run first
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'GOOGLE_SHEETS_ID': SPREADSHEET_ID,
+        'GOOGLE_SHEET_NAME': SHEET_TITLE,
+        'WP_API_URL': f"{wordpress.url}/wp-json/wp/v2",
+        'WP_API_USER': 'bench',
+        'WP_API_KEY': 'bench',
+        'DOC_CACHE_DIR': os.path.join(workdir, 'cache', 'docs'),
+        'RATE_LIMIT_ENABLED': 'true' if args.rate_limit else 'false',
+        'PUBLISH_MODE': 'future',
+        'PROFILE_DIR': os.path.join(ROOT, 'profiles'),
+    })
+    for name in ('GOOGLE_MAX_WORKERS', 'WP_MAX_WORKERS'):
+        value = getattr(args, name.lower())
+        if value:
+            os.environ[name] = str(value)
+    os.chdir(workdir)
+
+def run_once(size, google, wordpress, args, trace_memory=False):
+    from app import app, db
+    from utils import processor
+    from utils.google_api import GoogleAPI
+    from utils.metrics import metrics
+
+    class TimedProcessor(processor.ArticleProcessor):
+        def _process_row(self, i, row, col_map):
+            self.started.setdefault(i, time.perf_counter())
+            return super()._process_row(i, row, col_map)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    shutil.rmtree(app.config['DOC_CACHE_DIR'], ignore_errors=True)
+    GoogleAPI.meta_cache.clear()
+    GoogleAPI.header_cache.clear()
+    google.add_sheet(SPREADSHEET_ID, SHEET_TITLE, HEADERS, synthetic_rows(size, app.config['PUBLISH_MAX_PER_DAY']))
+    wordpress.reset()
+    google.reset_counts()
+    wordpress.reset_counts()
+    metrics.reset()
+
+    tracker = BenchTracker()
+    with app.app_context():
+        proc = TimedProcessor(args.mode, tracker=tracker, profile=args.profile and not trace_memory)
+        proc.started = {}
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        proc.run_processor()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+
+    latencies = [tracker.finished[i] - t for i, t in proc.started.items() if i in tracker.finished]
+    requests = {**google.counts(), **wordpress.counts()}
+    return {
+        'rows': size,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(size / elapsed, 2),
+        'latency_ms': {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in (50, 95, 99)},
+        'outcomes': tracker.outcomes,
+        'requests': requests,
+        'stages': metrics.stage_summary(),
+        'bytes': {'google_out': google.bytes_out, 'wordpress_in': wordpress.bytes_in},
+        'peak_memory_bytes': peak,
+    }
+
+def report(result):
+    lat = result['latency_ms']
+    print(f"📊 {result['rows']} rows in {result['seconds']:.2f}s: {result['rows_per_second']:,.1f} rows/s "
+          f"({', '.join(f'{k} {v}' for k, v in sorted(result['outcomes'].items()))})")
+    print(f"⏱ per-row latency p50 {lat['p50']:.0f}ms, p95 {lat['p95']:.0f}ms, p99 {lat['p99']:.0f}ms")
+    print("🌐 " + ', '.join(f"{api} {c['requests']} req/{c['calls']} calls" + (f" ({c['errors']} errors)" if c['errors'] else '')
+                           for api, c in result['requests'].items()))
+    print("🧩 " + ', '.join(f"{stage} {s['mean_ms']:.0f}ms x{s['count']}" for stage, s in result['stages'].items()))
+    if result['peak_memory_bytes'] is not None:
+        print(f"🧠 peak {result['peak_memory_bytes'] / 1024 / 1024:.1f} MiB allocated during the run")
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['rows']: r for r in json.load(f)['results']}
+    regressions = 0
+    for result in results:
+        before = baseline.get(result['rows'])
+        if not before:
+            continue
+        change = result['rows_per_second'] / before['rows_per_second'] - 1
+        marker = '❌' if change < -tolerance else '✅'
+        regressions += change < -tolerance
+        print(f"{marker} {result['rows']} rows: {before['rows_per_second']:,.1f} -> {result['rows_per_second']:,.1f} rows/s ({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', default='10,100,1000')
+    parser.add_argument('--mode', default='concurrent', choices=('sequential', 'concurrent'))
+    parser.add_argument('--latency', type=float, default=20, help='ms per request for every API')
+    parser.add_argument('--api-latency', default='', help='per-API overrides, e.g. docs=80,wordpress=150')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--api-error-rate', default='', help='per-API overrides, e.g. sheets=0.05')
+    parser.add_argument('--doc-pages', type=int, default=3)
+    parser.add_argument('--image-kb', type=int, default=500)
+    parser.add_argument('--google-max-workers', type=int)
+    parser.add_argument('--wp-max-workers', type=int)
+    parser.add_argument('--rate-limit', action='store_true')
+    parser.add_argument('--no-memory', action='store_true', help='skip the extra tracemalloc run per size')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile report per size to ./profiles')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+    args.json, args.baseline = (os.path.abspath(p) if p else None for p in (args.json, args.baseline))
+
+    from benchmarks.bench_doc_renderer import load_fixtures, build_document
+    from benchmarks.fakes import FakeGoogle, FakeWordPress, FakeGoogleServices
+
+    document, words = build_document(load_fixtures(), args.doc_pages)
+    latency = {'default': args.latency / 1000, **parse_api_values(args.api_latency, 0.001)}
+    error_rate = {'default': args.error_rate, **parse_api_values(args.api_error_rate)}
+    google = FakeGoogle(document=document, image_bytes=args.image_kb * 1024,
+                        latency=latency, error_rate=error_rate, seed=args.seed).start()
+    wordpress = FakeWordPress(latency=latency, error_rate=error_rate, seed=args.seed).start()
+
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    configure_environment(workdir, google, wordpress, args)
+    from utils import processor
+    from utils.clients import clients
+    processor.DRIVE_DOWNLOAD_URL = f"{google.url}/uc?export=download&id={{}}"
+    clients._google_services = FakeGoogleServices(google.url)
+
+    print(f"🧪 {args.mode} mode, {args.latency:g}ms latency, {args.error_rate:.1%} errors, "
+          f"{words} words per doc, {args.image_kb} KiB per image")
+    results = []
+    try:
+        for size in (int(n) for n in args.rows.split(',')):
+            result = run_once(size, google, wordpress, args)
+            if not args.no_memory:
+                result['peak_memory_bytes'] = run_once(size, google, wordpress, args, trace_memory=True)['peak_memory_bytes']
+            report(result)
+            results.append(result)
+    finally:
+        google.stop()
+        wordpress.stop()
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
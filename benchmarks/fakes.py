@@ -0,0 +1,364 @@
+"""In-process stand-ins for the Google (Sheets, Docs, Drive) and WordPress REST endpoints.
+
+Each fake is a threaded HTTP server on 127.0.0.1 that answers just enough of the real API for
+ArticleProcessor to run end to end, including the Drive/Docs batch endpoints and the WordPress
+batch API. Latency and error rate can be set globally or per API, and every request is counted.
+
+    google = FakeGoogle(latency={'docs': 0.08}, error_rate=0.01).start()
+    wordpress = FakeWordPress(latency=0.05).start()
+    ...
+    print(google.counts(), wordpress.counts())
+"""
+import email.parser, json, random, re, threading, time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from googleapiclient.discovery import build
+from utils.google_api import GoogleServices, MeteredHttp
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+ERROR_BODY = {'error': {'code': 503, 'message': 'Backend Error', 'status': 'UNAVAILABLE'}}
+_a1_re = re.compile(r"!([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+# Where Docs serves images that were uploaded into a document (imageProperties.contentUri)
+_content_host_re = re.compile(r"https://lh\d*(?:-rt)?\.googleusercontent\.com")
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, payload, headers = self.server.fake.handle(self.command, self.path, self.headers, body)
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json; charset=UTF-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.fake.count_bytes(len(body), len(payload))
+
+    do_GET = do_POST = do_PUT = do_OPTIONS = _handle
+
+class FakeServer:
+    # Routes are (method, path regex, api, handler); a handler returns (status, payload[, headers]).
+    # Batch routes wrap several calls in one round trip: the round trip is counted once, its items as calls.
+    routes = []
+    batch_routes = []
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset_counts()
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_counts(self):
+        with self._lock:
+            self._requests = defaultdict(int)
+            self._calls = defaultdict(int)
+            self._errors = defaultdict(int)
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+    def counts(self):
+        # requests: HTTP round trips; calls: API operations, counting each item of a batch
+        with self._lock:
+            return {api: {'requests': self._requests[api], 'calls': self._calls[api], 'errors': self._errors[api]}
+                    for api in sorted(set(self._requests) | set(self._calls))}
+
+    def count_bytes(self, received, sent):
+        with self._lock:
+            self.bytes_in += received
+            self.bytes_out += sent
+
+    def _setting(self, value, api):
+        return value.get(api, value.get('default', 0)) if isinstance(value, dict) else value
+
+    def _fails(self, api):
+        rate = self._setting(self.error_rate, api)
+        if rate and self.random.random() < rate:
+            with self._lock:
+                self._errors[api] += 1
+            return True
+        return False
+
+    def _route(self, method, path, routes=None):
+        for route_method, pattern, api, handler in (self.routes if routes is None else routes):
+            if route_method == method:
+                m = re.fullmatch(pattern, path)
+                if m:
+                    return api, handler, m
+        return None, None, None
+
+    def call(self, method, target, headers, body):
+        # One API operation, either a plain request or one item of a batch
+        parts = urlsplit(target)
+        api, handler, match = self._route(method, parts.path)
+        if handler is None:
+            return 'unknown', (404, {'error': {'code': 404, 'message': f'No route for {method} {parts.path}'}}, {})
+        with self._lock:
+            self._calls[api] += 1
+        if self._fails(api):
+            return api, (503, ERROR_BODY, {'Retry-After': '0'})
+        result = handler(self, match, parse_qs(parts.query), headers, body)
+        status, payload, extra = result if len(result) == 3 else (*result, {})
+        return api, (status, payload, extra)
+
+    def handle(self, method, target, headers, body):
+        parts = urlsplit(target)
+        api, handler, match = self._route(method, parts.path, self.batch_routes)
+        if handler:
+            result = handler(self, match, parse_qs(parts.query), headers, body)
+            result = result if len(result) == 3 else (*result, {})
+        else:
+            api, result = self.call(method, target, headers, body)
+        with self._lock:
+            self._requests[api] += 1
+        delay = self._setting(self.latency, api)
+        if delay:
+            time.sleep(delay)
+        return result
+
+class FakeGoogle(FakeServer):
+    # Sheets v4, Docs v1 and Drive v3 on one host, plus Drive's uc?export=download image links.
+    # Every document is the same rendered body; every image is a distinct PNG-signed blob.
+    def __init__(self, document=None, image_bytes=500 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.document = json.dumps(document or {'body': {'content': []}})
+        self.image_bytes = image_bytes
+        self._padding = bytes(max(image_bytes - len(PNG_SIGNATURE), 0))
+        self.sheets = {}
+
+    def add_sheet(self, spreadsheet_id, title, headers, rows):
+        # Adds (or replaces) one tab; a spreadsheet keeps its tabs in the order they were added
+        tabs = self.sheets.setdefault(spreadsheet_id, {})
+        tabs[title] = {'title': title, 'rows': [list(headers)] + [list(r) for r in rows]}
+
+    def _sheet(self, spreadsheet_id, a1):
+        # The tab named in an A1 range such as 'Sheet1'!A2:G
+        tabs = self.sheets.get(spreadsheet_id, {})
+        title = unquote(a1).rpartition('!')[0]
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+        return tabs.get(title)
+
+    def _spreadsheet(self, match, query, headers, body):
+        tabs = self.sheets.get(match.group(1))
+        if not tabs:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        return 200, {'sheets': [{'properties': {
+            'sheetId': n, 'title': sheet['title'],
+            'gridProperties': {'rowCount': len(sheet['rows']), 'columnCount': max(map(len, sheet['rows']))},
+        }} for n, sheet in enumerate(tabs.values())]}
+
+    def _batch_get(self, match, query, headers, body):
+        value_ranges = []
+        for a1 in query.get('ranges', []):
+            sheet = self._sheet(match.group(1), a1)
+            m = _a1_re.search(a1)
+            first = int(m.group(2) or 1)
+            last = int(m.group(4) or len(sheet['rows']))
+            value_ranges.append({'range': a1, 'majorDimension': 'ROWS', 'values': sheet['rows'][first - 1:last]})
+        return 200, {'spreadsheetId': match.group(1), 'valueRanges': value_ranges}
+
+    def _write(self, spreadsheet_id, a1, value):
+        sheet = self._sheet(spreadsheet_id, a1)
+        m = _a1_re.search(a1)
+        col = 0
+        for letter in m.group(1):
+            col = col * 26 + ord(letter) - 64
+        row = sheet['rows'][int(m.group(2)) - 1]
+        row.extend([''] * (col - len(row)))
+        row[col - 1] = value
+
+    def _batch_update(self, match, query, headers, body):
+        data = json.loads(body)['data']
+        with self._lock:
+            for item in data:
+                self._write(match.group(1), item['range'], item['values'][0][0])
+        return 200, {'spreadsheetId': match.group(1), 'totalUpdatedCells': len(data)}
+
+    def _update(self, match, query, headers, body):
+        with self._lock:
+            self._write(match.group(1), unquote(match.group(2)), json.loads(body)['values'][0][0])
+        return 200, {'spreadsheetId': match.group(1), 'updatedCells': 1}
+
+    def _document(self, match, query, headers, body):
+        payload = self.document.replace('"documentId": "bench"', f'"documentId": "{match.group(1)}"', 1)
+        payload = _content_host_re.sub(self.url, payload)
+        return 200, payload.encode('utf-8'), {'Content-Type': 'application/json; charset=UTF-8'}
+
+    def _file(self, match, query, headers, body):
+        return 200, {'version': '1', 'modifiedTime': '2026-01-01T00:00:00.000Z'}
+
+    def _download(self, match, query, headers, body):
+        file_id = query.get('id', [''])[0].encode('utf-8')
+        return 200, PNG_SIGNATURE + file_id + self._padding[len(file_id):], {'Content-Type': 'image/png'}
+
+    def _content_image(self, match, query, headers, body):
+        # Images pasted into a Doc; small, unlike the featured images
+        return 200, PNG_SIGNATURE + bytes(2048), {'Content-Type': 'image/png'}
+
+    def _batch(self, match, query, headers, body):
+        # multipart/mixed in, multipart/mixed out; each part is an application/http request
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode('utf-8') + body)
+        boundary = 'batch_fake'
+        out = []
+        for part in message.get_payload():
+            request_text = part.get_payload()
+            head, _, part_body = request_text.partition('\r\n\r\n')
+            method, target = head.split('\r\n', 1)[0].split(' ')[:2]
+            api, (status, payload, _) = self.call(method, target, {}, part_body.encode('utf-8'))
+            if isinstance(payload, (dict, list)):
+                payload = json.dumps(payload).encode('utf-8')
+            out.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                       f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                       f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                       f"Content-Type: application/json; charset=UTF-8\r\n\r\n".encode('utf-8') + payload + b"\r\n")
+        out.append(f"--{boundary}--\r\n".encode('utf-8'))
+        return 200, b''.join(out), {'Content-Type': f'multipart/mixed; boundary={boundary}'}
+
+    batch_routes = [
+        ('POST', r'/batch/drive/v3', 'drive', _batch),
+        ('POST', r'/batch', 'docs', _batch),
+    ]
+    routes = [
+        ('GET', r'/v4/spreadsheets/([^/]+)', 'sheets', _spreadsheet),
+        ('GET', r'/v4/spreadsheets/([^/]+)/values:batchGet', 'sheets', _batch_get),
+        ('POST', r'/v4/spreadsheets/([^/]+)/values:batchUpdate', 'sheets', _batch_update),
+        ('PUT', r'/v4/spreadsheets/([^/]+)/values/(.+)', 'sheets', _update),
+        ('GET', r'/v1/documents/([^/]+)', 'docs', _document),
+        ('GET', r'/drive/v3/files/([^/]+)', 'drive', _file),
+        ('GET', r'/uc', 'images', _download),
+        ('GET', r'/docsz/.+', 'images', _content_image),
+    ]
+
+class FakeWordPress(FakeServer):
+    # /wp-json/wp/v2 posts and media plus /wp-json/batch/v1
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.posts = {}
+        self.media = {}
+        self._next_id = 1
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def _create_post(self, match, query, headers, body):
+        data = json.loads(body)
+        post = dict(data, id=self._new_id())
+        self.posts[post['id']] = post
+        return 201, {'id': post['id'], 'slug': post.get('slug'), 'status': post.get('status'), 'date': post.get('date')}
+
+    def _update_post(self, match, query, headers, body):
+        post = self.posts.get(int(match.group(1)))
+        if post is None:
+            return 404, {'code': 'rest_post_invalid_id', 'message': 'Invalid post ID.'}
+        post.update(json.loads(body))
+        return 200, {'id': post['id'], 'slug': post.get('slug'), 'status': post.get('status'), 'date': post.get('date')}
+
+    def _find_posts(self, match, query, headers, body):
+        slug = query.get('slug', [None])[0]
+        return 200, [{'id': p['id'], 'slug': p['slug'], 'status': p['status']} for p in self.posts.values() if p.get('slug') == slug]
+
+    def _upload_media(self, match, query, headers, body):
+        fields = dict(re.findall(rb'name="([a-z_]+)"\r\n\r\n(.*?)\r\n', body)) if b'form-data' in body[:200] else {}
+        media_id = self._new_id()
+        self.media[media_id] = {'id': media_id, 'size': len(body)}
+        return 201, {'id': media_id, 'alt_text': fields.get(b'alt_text', b'').decode('utf-8')}
+
+    def _update_media(self, match, query, headers, body):
+        media = self.media.get(int(match.group(1)))
+        if media is None:
+            return 404, {'code': 'rest_post_invalid_id', 'message': 'Invalid post ID.'}
+        media.update(json.loads(body))
+        return 200, {'id': media['id']}
+
+    def _get_media(self, match, query, headers, body):
+        if int(match.group(1)) not in self.media:
+            return 404, {'code': 'rest_post_invalid_id', 'message': 'Invalid post ID.'}
+        return 200, {'id': int(match.group(1)), 'source_url': f"{self.url}/wp-content/uploads/{match.group(1)}.png"}
+
+    def _batch_options(self, match, query, headers, body):
+        return 200, {'namespace': 'batch/v1', 'methods': ['POST']}
+
+    def _batch(self, match, query, headers, body):
+        responses = []
+        for sub in json.loads(body)['requests']:
+            if not sub['path'].startswith('/wp/v2/posts'):
+                # Like core, where attachments are not registered with allow_batch
+                responses.append({'status': 400, 'body': {'code': 'rest_batch_not_allowed'}, 'headers': {}})
+                continue
+            _, (status, payload, _) = self.call(sub['method'], '/wp-json' + sub['path'], {}, json.dumps(sub.get('body', {})).encode('utf-8'))
+            responses.append({'status': status, 'body': payload, 'headers': {}})
+        return 207, {'responses': responses}
+
+    routes = [
+        ('GET', r'/wp-json/wp/v2/posts', 'wordpress', _find_posts),
+        ('POST', r'/wp-json/wp/v2/posts', 'wordpress', _create_post),
+        ('POST', r'/wp-json/wp/v2/posts/(\d+)', 'wordpress', _update_post),
+        ('POST', r'/wp-json/wp/v2/media', 'wordpress', _upload_media),
+        ('POST', r'/wp-json/wp/v2/media/(\d+)', 'wordpress', _update_media),
+        ('GET', r'/wp-json/wp/v2/media/(\d+)', 'wordpress', _get_media),
+        ('OPTIONS', r'/wp-json/batch/v1', 'wordpress', _batch_options),
+    ]
+    batch_routes = [
+        ('POST', r'/wp-json/batch/v1', 'wordpress', _batch),
+    ]
+
+    def reset(self):
+        with self._lock:
+            self.posts.clear()
+            self.media.clear()
+
+class RedirectedHttp(MeteredHttp):
+    # Sends every Google API URL to the fake, keeping path and query
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, uri, *args, **kwargs):
+        parts = urlsplit(uri)
+        return super().request(f"{self.base_url}{parts.path}{'?' + parts.query if parts.query else ''}", *args, **kwargs)
+
+class FakeGoogleServices(GoogleServices):
+    # Real discovery-built clients without credentials, talking to a FakeGoogle
+    def __init__(self, base_url):
+        self.base_url = base_url
+        super().__init__(creds=None)
+
+    def _build(self, name, version):
+        return build(name, version, http=RedirectedHttp(self.base_url), requestBuilder=self._build_request,
+                     static_discovery=True, cache_discovery=False)
+
+    def ensure_token(self):
+        pass
+
+    def _new_http(self):
+        return RedirectedHttp(self.base_url)
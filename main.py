@@ -1,5 +1,6 @@
 from app import app
 import logging
+import os
 
 logging.basicConfig(
     level=logging.INFO,  # אפשר גם DEBUG אם אתה רוצה לראות הכל
@@ -12,4 +13,27 @@ logging.basicConfig(
 
 if __name__ == "__main__":
     logging.info("🚀 Starting Flask app manually (no background tasks)")
+    # debug=True runs this file twice: a reloader parent that only watches for changes, and the child
+    # (WERKZEUG_RUN_MAIN=true) that serves requests. Background threads belong in the child only.
+    serving = os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    if serving:
+        # Jobs queued before a restart, and running ones whose worker died, are picked up without a new submission
+        from utils.jobs import job_queue
+        job_queue.ensure_started()
+    if serving and app.config["PUBLISH_MODE"] == "release" and app.config["WP_API_URL"]:
+        # Drafts still waiting for their slot are released by this process after a restart too
+        from utils.processor import wordpress_client
+        from utils.scheduler import scheduler_for
+        scheduler_for(wordpress_client())
+    if serving and app.config["FANOUT_TARGETS"]:
+        # This process takes shards of fan-out runs started by any process sharing the database
+        from utils.fanout import shard_queue
+        from utils.processor import wordpress_client
+        from utils.scheduler import scheduler_for
+        from utils.targets import load_targets
+        with app.app_context():
+            if app.config["PUBLISH_MODE"] == "release":
+                for target in load_targets(app.config).values():
+                    scheduler_for(wordpress_client(target))
+            shard_queue.ensure_started()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -2,7 +2,16 @@ from datetime import datetime
 from app import db
 
 class Article(db.Model):
+    __table_args__ = (db.UniqueConstraint('spreadsheet_id', 'sheet_name', 'sheet_row'),)
+
     id = db.Column(db.Integer, primary_key=True)
+    spreadsheet_id = db.Column(db.String(200))
+    sheet_name = db.Column(db.String(200))
+    sheet_row = db.Column(db.Integer)
+    doc_id = db.Column(db.String(200))
+    doc_revision = db.Column(db.String(100))
+    fingerprint = db.Column(db.String(64))
+    post_url = db.Column(db.String(500))
     title = db.Column(db.String(200), nullable=False)
     category = db.Column(db.String(100))
     status = db.Column(db.String(20), default='draft')
@@ -20,3 +29,138 @@ class Log(db.Model):
     level = db.Column(db.String(20))
     message = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Job(db.Model):
+    id = db.Column(db.String(36), primary_key=True)
+    start_row = db.Column(db.Integer, nullable=False)
+    end_row = db.Column(db.Integer, nullable=False)
+    mode = db.Column(db.String(20), default='sequential')
+    force = db.Column(db.Boolean, default=False)
+    state = db.Column(db.String(20), default='queued', index=True)
+    total_rows = db.Column(db.Integer, default=0)
+    processed_rows = db.Column(db.Integer, default=0)
+    succeeded_rows = db.Column(db.Integer, default=0)
+    failed_rows = db.Column(db.Integer, default=0)
+    skipped_rows = db.Column(db.Integer, default=0)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'start_row': self.start_row,
+            'end_row': self.end_row,
+            'mode': self.mode,
+            'force': self.force,
+            'state': self.state,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'succeeded_rows': self.succeeded_rows,
+            'failed_rows': self.failed_rows,
+            'skipped_rows': self.skipped_rows,
+            'cancel_requested': self.cancel_requested,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class MediaAsset(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    site_url = db.Column(db.String(500), nullable=False, index=True)
+    drive_file_id = db.Column(db.String(200), index=True)
+    content_hash = db.Column(db.String(64), index=True)
+    wordpress_media_id = db.Column(db.Integer, nullable=False)
+    verified_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ScheduledPost(db.Model):
+    # One reserved publish slot per sheet row; publish_at is unique per site so two rows never share a slot
+    __table_args__ = (
+        db.UniqueConstraint('spreadsheet_id', 'sheet_name', 'sheet_row'),
+        db.UniqueConstraint('site_url', 'publish_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    site_url = db.Column(db.String(500), nullable=False, index=True)
+    spreadsheet_id = db.Column(db.String(200))
+    sheet_name = db.Column(db.String(200))
+    sheet_row = db.Column(db.Integer)
+    title = db.Column(db.String(200))
+    wordpress_id = db.Column(db.Integer)
+    publish_at = db.Column(db.DateTime, nullable=False, index=True)
+    state = db.Column(db.String(20), default='reserved', index=True)
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sheet_row': self.sheet_row,
+            'title': self.title,
+            'wordpress_id': self.wordpress_id,
+            'publish_at': self.publish_at.isoformat() if self.publish_at else None,
+            'state': self.state,
+            'attempts': self.attempts,
+            'error': self.error,
+            'released_at': self.released_at.isoformat() if self.released_at else None,
+        }
+
+class RowShard(db.Model):
+    # A slice of one tab's rows in a fan-out run. Workers in any process lease a shard before processing it;
+    # lease_token fences out a worker whose lease expired and was taken over, so a row range is only ever
+    # worked on by one worker at a time.
+    __table_args__ = (db.UniqueConstraint('run_id', 'target', 'start_row'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(32), nullable=False, index=True)
+    target = db.Column(db.String(100), nullable=False)
+    seq = db.Column(db.Integer, default=0)
+    spreadsheet_id = db.Column(db.String(200))
+    sheet_name = db.Column(db.String(200))
+    start_row = db.Column(db.Integer, nullable=False)
+    end_row = db.Column(db.Integer, nullable=False)
+    mode = db.Column(db.String(20), default='sequential')
+    force = db.Column(db.Boolean, default=False)
+    state = db.Column(db.String(20), default='pending', index=True)
+    owner = db.Column(db.String(200))
+    lease_token = db.Column(db.String(32))
+    lease_expires_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0)
+    total_rows = db.Column(db.Integer, default=0)
+    processed_rows = db.Column(db.Integer, default=0)
+    succeeded_rows = db.Column(db.Integer, default=0)
+    failed_rows = db.Column(db.Integer, default=0)
+    skipped_rows = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'target': self.target,
+            'sheet_name': self.sheet_name,
+            'start_row': self.start_row,
+            'end_row': self.end_row,
+            'state': self.state,
+            'owner': self.owner,
+            'attempts': self.attempts,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'succeeded_rows': self.succeeded_rows,
+            'failed_rows': self.failed_rows,
+            'skipped_rows': self.skipped_rows,
+            'error': self.error,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -1,6 +1,23 @@
+const MAX_ACTIVITY_ROWS = 50;
+const FALLBACK_POLL_MS = 30000;
+// With the stream open, still revalidate now and then: events from other server processes don't reach this stream
+const REVALIDATE_EVERY = 10;
+const watchedJobs = {};
+let eventStream = null;
+let statusRefresh = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     updateDashboard();
-    setInterval(updateDashboard, 30000);
+    connectEvents();
+    // Polls while the event stream is down, and rarely otherwise; the JSON endpoints answer 304 when nothing changed
+    let ticks = 0;
+    setInterval(function() {
+        ticks++;
+        if (streamOpen() && ticks % REVALIDATE_EVERY !== 0) return;
+        // A job run by another server process only reports its progress through these polls
+        updateDashboard();
+        Object.keys(watchedJobs).forEach(jobId => pollJob(jobId, watchedJobs[jobId]));
+    }, FALLBACK_POLL_MS);
 
     const processRows26_27Button = document.getElementById('process-rows-26-27');
     if (processRows26_27Button) {
@@ -40,6 +57,39 @@ function updateDashboard() {
         .catch(error => console.error('Error loading logs:', error));
 }
 
+function streamOpen() {
+    return eventStream !== null && eventStream.readyState === EventSource.OPEN;
+}
+
+function connectEvents() {
+    if (typeof EventSource === 'undefined') return;
+    eventStream = new EventSource('/api/events');
+
+    eventStream.addEventListener('log', function(e) {
+        appendActivity(JSON.parse(e.data));
+        scheduleStatusRefresh();
+    });
+    eventStream.addEventListener('job', function(e) {
+        const job = JSON.parse(e.data);
+        const resultElement = watchedJobs[job.id];
+        if (resultElement) renderJob(job, resultElement);
+    });
+    // EventSource reconnects by itself and resumes from the last event ID it saw
+    eventStream.addEventListener('open', scheduleStatusRefresh);
+}
+
+function scheduleStatusRefresh() {
+    // Coalesces bursts of events into one status request
+    if (statusRefresh) return;
+    statusRefresh = setTimeout(function() {
+        statusRefresh = null;
+        fetch('/api/status')
+            .then(response => response.json())
+            .then(updateStatusCards)
+            .catch(error => console.error('Error updating status cards:', error));
+    }, 1000);
+}
+
 function updateStatusCards(data) {
     document.querySelector('#pending-posts .h3').textContent = data.pending_posts;
     document.querySelector('#published-posts .h3').textContent = data.published_today;
@@ -50,16 +100,26 @@ function updateActivityLog(activities) {
     const tbody = document.querySelector('#activity-log tbody');
     tbody.innerHTML = '';
 
-    activities.forEach(activity => {
-        const row = document.createElement('tr');
-        row.innerHTML = `
-            <td>${formatDate(activity.time || activity.timestamp)}</td>
-            <td>${activity.action}</td>
-            <td><span class="badge bg-${activity.status === 'success' ? 'success' : activity.status === 'error' ? 'danger' : 'secondary'}">${activity.status}</span></td>
-            <td>${activity.details}</td>
-        `;
-        tbody.appendChild(row);
-    });
+    activities.forEach(activity => tbody.appendChild(activityRow(activity)));
+}
+
+function appendActivity(activity) {
+    const tbody = document.querySelector('#activity-log tbody');
+    tbody.appendChild(activityRow(activity));
+    while (tbody.rows.length > MAX_ACTIVITY_ROWS) {
+        tbody.deleteRow(0);
+    }
+}
+
+function activityRow(activity) {
+    const row = document.createElement('tr');
+    row.innerHTML = `
+        <td>${formatDate(activity.time || activity.timestamp)}</td>
+        <td>${activity.action}</td>
+        <td><span class="badge bg-${activity.status === 'success' ? 'success' : activity.status === 'error' ? 'danger' : 'secondary'}">${activity.status}</span></td>
+        <td>${activity.details}</td>
+    `;
+    return row;
 }
 
 function formatDate(dateString) {
@@ -67,6 +127,45 @@ function formatDate(dateString) {
     return date.toLocaleString();
 }
 
+function watchJob(jobId, resultElement) {
+    // Job events arrive over the stream; the first fetch catches anything that happened before we subscribed
+    watchedJobs[jobId] = resultElement;
+    pollJob(jobId, resultElement);
+}
+
+function pollJob(jobId, resultElement) {
+    fetch(`/api/jobs/${jobId}`)
+        .then(response => response.json())
+        .then(job => {
+            if (renderJob(job, resultElement) && !streamOpen()) {
+                setTimeout(() => pollJob(jobId, resultElement), 2000);
+            }
+        })
+        .catch(error => console.error('Error polling job:', error));
+}
+
+function renderJob(job, resultElement) {
+    // Returns true while the job is still queued or running
+    if (watchedJobs[job.id] !== resultElement) return false;
+    const progress = `${job.processed_rows}/${job.total_rows} rows (${job.succeeded_rows} published, ${job.failed_rows} failed, ${job.skipped_rows} skipped)`;
+    if (job.state === 'queued' || job.state === 'running') {
+        resultElement.innerHTML = `Job ${job.state}: rows ${job.start_row} to ${job.end_row} - ${progress}`;
+        return true;
+    }
+
+    delete watchedJobs[job.id];
+    resultElement.classList.remove('alert-info');
+    if (job.state === 'done') {
+        resultElement.classList.add('alert-success');
+        resultElement.innerHTML = `Done! ${progress}. Check the activity log for details.`;
+    } else {
+        resultElement.classList.add('alert-danger');
+        resultElement.innerHTML = `Job ${job.state}: ${job.error || progress}`;
+    }
+    scheduleStatusRefresh();
+    return false;
+}
+
 function processSpecificRows26And27() {
     const resultElement = document.getElementById('process-result');
     const button = document.getElementById('process-rows-26-27');
@@ -86,11 +185,10 @@ function processSpecificRows26And27() {
     })
     .then(response => response.json())
     .then(data => {
-        resultElement.classList.remove('alert-info');
         if (data.success) {
-            resultElement.classList.add('alert-success');
-            resultElement.innerHTML = 'Success! Rows 26 and 27 have been processed. Check the activity log for details.';
+            watchJob(data.job_id, resultElement);
         } else {
+            resultElement.classList.remove('alert-info');
             resultElement.classList.add('alert-danger');
             resultElement.innerHTML = `Error: ${data.error || 'Unknown error occurred'}`;
         }
@@ -99,7 +197,6 @@ function processSpecificRows26And27() {
         button.innerHTML = '<i data-feather="play"></i> Process Rows 26-27';
         if (typeof feather !== 'undefined') feather.replace();
 
-        setTimeout(updateDashboard, 2000);
     })
     .catch(error => {
         console.error('Error processing rows:', error);
@@ -138,11 +235,10 @@ function processCustomRows(startRow, endRow) {
     })
     .then(response => response.json())
     .then(data => {
-        resultElement.classList.remove('alert-info');
         if (data.success) {
-            resultElement.classList.add('alert-success');
-            resultElement.innerHTML = `Success! Rows ${startRow} to ${endRow} have been processed. Check the activity log for details.`;
+            watchJob(data.job_id, resultElement);
         } else {
+            resultElement.classList.remove('alert-info');
             resultElement.classList.add('alert-danger');
             resultElement.innerHTML = `Error: ${data.error || 'Unknown error occurred'}`;
         }
@@ -151,7 +247,6 @@ function processCustomRows(startRow, endRow) {
         submitButton.innerHTML = '<i data-feather="play-circle"></i> Process';
         if (typeof feather !== 'undefined') feather.replace();
 
-        setTimeout(updateDashboard, 2000);
     })
     .catch(error => {
         console.error('Error processing rows:', error);
@@ -0,0 +1,51 @@
+import logging, threading, time
+from utils.google_api import GoogleAPI, GoogleServices
+from utils.wordpress_api import WordPressAPI
+
+class ClientRegistry:
+    # Process-wide home for API clients: Google credentials and discovery-built services are created
+    # once, and each WordPress site keeps one WordPressAPI (and so one connection pool)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._google_services = None
+        self._wordpress = {}
+        self.startup_timings = {}
+
+    def google_services(self):
+        if self._google_services is None:
+            with self._lock:
+                if self._google_services is None:
+                    started = time.perf_counter()
+                    services = GoogleServices.from_service_account()
+                    if services is None:
+                        return None
+                    self.startup_timings['google'] = dict(services.timings)
+                    self.startup_timings['google']['ready_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                    logging.info(f"⏱ Google clients ready in {self.startup_timings['google']['ready_ms']} ms "
+                                 f"({self.startup_timings['google']})")
+                    self._google_services = services
+        return self._google_services
+
+    def google_api(self, **kwargs):
+        services = self.google_services()
+        if services is None:
+            raise RuntimeError("Google credentials are not available")
+        return GoogleAPI(services=services, **kwargs)
+
+    def wordpress(self, api_url, username, api_key, **kwargs):
+        key = (api_url, username)
+        with self._lock:
+            wp = self._wordpress.get(key)
+            if wp is None:
+                started = time.perf_counter()
+                wp = self._wordpress[key] = WordPressAPI(api_url, username, api_key, **kwargs)
+                self.startup_timings.setdefault('wordpress', {})[api_url] = round((time.perf_counter() - started) * 1000, 1)
+        return wp
+
+    def reset(self):
+        with self._lock:
+            self._google_services = None
+            self._wordpress.clear()
+            self.startup_timings.clear()
+
+clients = ClientRegistry()
@@ -0,0 +1,81 @@
+import json, logging, os, threading
+from utils.doc_renderer import RENDERER_VERSION
+
+class DocCache:
+    def __init__(self, cache_dir='cache/docs', max_bytes=100 * 1024 * 1024, variant=None):
+        self.cache_dir = cache_dir
+        # HTML can embed site-specific URLs (re-hosted Doc images), so each site gets its own entries
+        self.variant = variant
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, doc_id):
+        return os.path.join(self.cache_dir, f"{doc_id}.json")
+
+    def _key(self, revision):
+        # HTML rendered by an older renderer version is treated as a miss
+        return f"{revision}@r{RENDERER_VERSION}" + (f"@{self.variant}" if self.variant else '')
+
+    def get(self, doc_id, revision):
+        path = self._path(doc_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('revision') != self._key(revision):
+            return None
+        # mtime doubles as the LRU clock
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get('html')
+
+    def put(self, doc_id, revision, html):
+        path = self._path(doc_id)
+        data = json.dumps({'doc_id': doc_id, 'revision': self._key(revision), 'html': html}, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            total = self._current_size()
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._total_bytes = total - old_size + len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep=path)
+
+    def _current_size(self):
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, _, size in self._entries())
+        return self._total_bytes
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, os.path.join(self.cache_dir, name), st.st_size))
+        return entries
+
+    def _evict(self, keep=None):
+        entries = sorted(self._entries())
+        self._total_bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+                logging.debug(f"🧹 Evicted cached doc {os.path.basename(path)}")
+            except OSError:
+                pass
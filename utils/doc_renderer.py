@@ -0,0 +1,191 @@
+from html import escape
+
+# Bump when the output changes so cached HTML from an older renderer is not reused
+RENDERER_VERSION = 3
+
+HEADING_TAGS = {
+    'TITLE': 'h1',
+    'HEADING_1': 'h1',
+    'HEADING_2': 'h2',
+    'HEADING_3': 'h3',
+    'HEADING_4': 'h4',
+    'HEADING_5': 'h5',
+    'HEADING_6': 'h6',
+}
+UNORDERED_GLYPHS = ('GLYPH_TYPE_UNSPECIFIED', 'NONE')
+
+class DocRenderer:
+    # Converts a Docs API document resource to HTML in one pass over body.content, writing
+    # into a list of fragments that is joined once at the end. image_url(object_id, content_uri) re-hosts
+    # images that were uploaded into the Doc and returns their new URL, or None to leave them out.
+    def __init__(self, document, skip_first_h1=True, image_url=None):
+        self.document = document
+        self.lists = document.get('lists', {})
+        self.inline_objects = document.get('inlineObjects', {})
+        self.skip_first_h1 = skip_first_h1
+        self.image_url = image_url
+        self._list_tags = {}
+        self.out = []
+        self.blocks = 0
+
+    def render(self):
+        self._content(self.document.get('body', {}).get('content', []))
+        return ''.join(self.out).strip()
+
+    def _content(self, elements):
+        # Each call keeps its own list stack so table cells can hold lists of their own
+        stack = []
+        for element in elements:
+            if 'paragraph' in element:
+                self._paragraph(element['paragraph'], stack)
+            elif 'table' in element:
+                self._close_lists(stack, 0)
+                self._table(element['table'])
+        self._close_lists(stack, 0)
+
+    def _paragraph(self, para, stack):
+        style = para.get('paragraphStyle', {})
+        tag = HEADING_TAGS.get(style.get('namedStyleType'), 'p')
+        bullet = para.get('bullet')
+
+        text = self._inline(para.get('elements', ()))
+        if not text:
+            return
+
+        if tag == 'h1' and self.skip_first_h1 and not bullet:
+            self.skip_first_h1 = False
+            return
+
+        if bullet:
+            self._list_item(bullet, stack)
+            self.out.append(text)
+        elif text == '<hr>':
+            self._close_lists(stack, 0)
+            self.out.append("<hr>\n")
+        else:
+            self._close_lists(stack, 0)
+            self.out.append(f"<{tag}>{text}</{tag}>\n")
+        self.blocks += 1
+
+    def _list_item(self, bullet, stack):
+        level = bullet.get('nestingLevel', 0)
+        list_id = bullet.get('listId')
+        tag = self._list_tag(list_id, level)
+
+        if stack and stack[0][1] != list_id:
+            self._close_lists(stack, 0)
+        self._close_lists(stack, level + 1)
+        if len(stack) == level + 1 and stack[-1][0] != tag:
+            self._close_lists(stack, level)
+        if len(stack) == level + 1:
+            self.out.append("</li>\n")
+        while len(stack) < level + 1:
+            if stack and not stack[-1][2]:
+                # A nested list opens inside the parent's current item; make sure there is one
+                self.out.append("<li>")
+                stack[-1][2] = True
+            self.out.append(f"<{tag}>\n")
+            stack.append([tag, list_id, False])
+        self.out.append("<li>")
+        stack[-1][2] = True
+
+    def _close_lists(self, stack, depth):
+        while len(stack) > depth:
+            tag, _, li_open = stack.pop()
+            if li_open:
+                self.out.append("</li>\n")
+            self.out.append(f"</{tag}>\n")
+
+    def _list_tag(self, list_id, level):
+        key = (list_id, level)
+        if key not in self._list_tags:
+            levels = self.lists.get(list_id, {}).get('listProperties', {}).get('nestingLevels', [])
+            glyph = levels[level].get('glyphType') if level < len(levels) else None
+            self._list_tags[key] = 'ol' if glyph and glyph not in UNORDERED_GLYPHS else 'ul'
+        return self._list_tags[key]
+
+    def _inline(self, elements):
+        out = []
+        for elem in elements:
+            if 'textRun' in elem:
+                run = elem['textRun']
+                text = run.get('content', '').replace('\n', '')
+                if not text:
+                    continue
+                if not text.strip():
+                    out.append(' ')
+                    continue
+                # Shift+Enter line breaks arrive as vertical tabs
+                text = escape(text, quote=False).replace('\x0b', '<br>')
+                out.append(self._styled(text, run.get('textStyle', {})))
+            elif 'inlineObjectElement' in elem:
+                img = self._image(elem['inlineObjectElement'].get('inlineObjectId'))
+                if img:
+                    out.append(img)
+            elif 'horizontalRule' in elem:
+                out.append('<hr>')
+        return ''.join(out).strip()
+
+    def _styled(self, text, style):
+        if not style:
+            return text
+        if style.get('bold'):
+            text = f"<strong>{text}</strong>"
+        if style.get('italic'):
+            text = f"<em>{text}</em>"
+        if style.get('underline') and not style.get('link'):
+            text = f"<u>{text}</u>"
+        if style.get('strikethrough'):
+            text = f"<s>{text}</s>"
+        offset = style.get('baselineOffset')
+        if offset == 'SUPERSCRIPT':
+            text = f"<sup>{text}</sup>"
+        elif offset == 'SUBSCRIPT':
+            text = f"<sub>{text}</sub>"
+        link = style.get('link')
+        if link:
+            url = link.get('url') or (f"#{link['headingId']}" if link.get('headingId') else '#')
+            text = f'<a href="{escape(url)}" target="_blank" rel="noopener">{text}</a>'
+        return text
+
+    def _image(self, object_id):
+        embedded = self.inline_objects.get(object_id, {}).get('inlineObjectProperties', {}).get('embeddedObject', {})
+        props = embedded.get('imageProperties', {})
+        src = props.get('sourceUri')
+        if not src and props.get('contentUri'):
+            # Images uploaded into the Doc only have a contentUri, which expires after about 30 minutes,
+            # so it must never end up in a post or in cached HTML
+            src = self.image_url(object_id, props['contentUri']) if self.image_url else None
+        if not src:
+            return None
+        alt = embedded.get('description') or embedded.get('title') or ''
+        size = embedded.get('size', {})
+        attrs = ''
+        for name in ('width', 'height'):
+            magnitude = size.get(name, {}).get('magnitude')
+            if magnitude and size[name].get('unit') == 'PT':
+                # Points to CSS pixels
+                attrs += f' {name}="{round(magnitude * 4 / 3)}"'
+        return f'<img src="{escape(src)}" alt="{escape(alt)}"{attrs}>'
+
+    def _table(self, table):
+        out = self.out
+        out.append("<table>\n<tbody>\n")
+        for row in table.get('tableRows', []):
+            out.append("<tr>")
+            for cell in row.get('tableCells', []):
+                span = cell.get('tableCellStyle', {})
+                attrs = ''
+                if span.get('columnSpan', 1) > 1:
+                    attrs += f' colspan="{span["columnSpan"]}"'
+                if span.get('rowSpan', 1) > 1:
+                    attrs += f' rowspan="{span["rowSpan"]}"'
+                out.append(f"<td{attrs}>")
+                self._content(cell.get('content', []))
+                out.append("</td>")
+            out.append("</tr>\n")
+        out.append("</tbody>\n</table>\n")
+        self.blocks += 1
+
+def render_document(document, skip_first_h1=True, image_url=None):
+    return DocRenderer(document, skip_first_h1, image_url).render()
@@ -0,0 +1,62 @@
+import json, threading, time, uuid
+from collections import deque
+
+EVENT_HISTORY = 1000
+HEARTBEAT_SECONDS = 15
+# Streams end after this long and EventSource reconnects with Last-Event-ID, so a stream never pins
+# a worker indefinitely
+STREAM_SECONDS = 300
+RECONNECT_MS = 3000
+
+class EventBus:
+    # In-process fan-out of dashboard events (run log lines, row outcomes, job progress) to
+    # Server-Sent Events streams. Events published in another process are not seen here; the
+    # dashboard's fallback poll covers those.
+    def __init__(self, history=EVENT_HISTORY):
+        # Event IDs are "<epoch>-<n>"; after a restart old IDs don't match the epoch and are ignored
+        self.epoch = uuid.uuid4().hex[:8]
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._next = 1
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._events.append((self._next, kind, data))
+            self._next += 1
+            self._cond.notify_all()
+
+    def last_id(self):
+        with self._cond:
+            return self._next - 1
+
+    def _since(self, seq):
+        return [e for e in self._events if e[0] > seq]
+
+    def _parse_id(self, event_id):
+        epoch, _, seq = (event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def stream(self, last_event_id=None, heartbeat=HEARTBEAT_SECONDS, lifetime=STREAM_SECONDS):
+        # Generator of text/event-stream chunks. Resumes after last_event_id when it is still in the
+        # history, otherwise starts from now (the client has just loaded the JSON endpoints).
+        seq = self._parse_id(last_event_id)
+        if seq is None:
+            seq = self.last_id()
+        deadline = time.monotonic() + lifetime
+        yield f"retry: {RECONNECT_MS}\n\n"
+        while time.monotonic() < deadline:
+            with self._cond:
+                pending = self._since(seq)
+                if not pending:
+                    self._cond.wait(timeout=min(heartbeat, max(deadline - time.monotonic(), 0)))
+                    pending = self._since(seq)
+            if not pending:
+                yield ": keep-alive\n\n"
+                continue
+            for n, kind, data in pending:
+                seq = n
+                yield f"id: {self.epoch}-{n}\nevent: {kind}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+events = EventBus()
@@ -0,0 +1,212 @@
+import logging, os, socket, threading, uuid
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from app import app, db
+from models import RowShard
+from utils.clients import clients
+from utils.events import events
+from utils.jobs import RowTracker, WorkerQueue
+from utils.targets import load_targets
+
+ACTIVE_STATES = ('pending', 'leased')
+ROW_COLUMNS = ('total_rows', 'processed_rows', 'succeeded_rows', 'failed_rows', 'skipped_rows')
+# Candidates looked at per claim; others may be racing for the first one
+CLAIM_CANDIDATES = 10
+
+class FanoutConflict(Exception):
+    def __init__(self, run_id, targets):
+        super().__init__(f"Run {run_id} is still processing {', '.join(sorted(targets))}")
+        self.run_id = run_id
+
+class ShardTracker(RowTracker):
+    # The job tracker interface for one leased shard. Every call renews the lease; once the lease is gone
+    # (expired and taken over by another worker, or the run was cancelled) the processor sees a cancellation
+    # and stops before its next row.
+    model = RowShard
+
+    def __init__(self, shard, token):
+        self.shard_id = shard.id
+        self.run_id = shard.run_id
+        self.target = shard.target
+        self.token = token
+
+    def _row_event(self):
+        return {'run_id': self.run_id, 'target': self.target}
+
+    def cancelled(self):
+        return not self._update({})
+
+    def _update(self, values):
+        values['lease_expires_at'] = datetime.utcnow() + timedelta(seconds=app.config['FANOUT_LEASE_SECONDS'])
+        held = RowShard.query.filter_by(id=self.shard_id, lease_token=self.token, state='leased').update(
+            values, synchronize_session=False)
+        db.session.commit()
+        return held
+
+class ShardQueue(WorkerQueue):
+    # Worker threads that lease shards of any fan-out run from the database. Every process that starts
+    # the queue (gunicorn workers, other hosts on the same database) takes part in every run.
+    kind = 'shard'
+    workers_setting = 'FANOUT_WORKERS'
+
+    def __init__(self):
+        super().__init__()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _started_note(self):
+        return f" as {self.owner}"
+
+    def _claim_next(self):
+        # Oldest run first; within a run shards are ordered by their index in the tab, so every target's
+        # first shard is handed out before anyone's second and the targets progress side by side
+        targets = load_targets(app.config)
+        if not targets:
+            return None
+        now = datetime.utcnow()
+        candidates = RowShard.query.filter(
+            RowShard.target.in_(list(targets)),
+            or_(RowShard.state == 'pending',
+                and_(RowShard.state == 'leased', RowShard.lease_expires_at < now)),
+        ).order_by(RowShard.created_at, RowShard.seq, RowShard.id).limit(CLAIM_CANDIDATES).all()
+
+        for shard in candidates:
+            # Read before the commits below expire and reload the row
+            shard_id, state, previous_owner = shard.id, shard.state, shard.owner
+            match = RowShard.query.filter_by(id=shard_id, state=state, lease_token=shard.lease_token)
+            if state == 'leased':
+                # The owner may have renewed since the SELECT; only a lease that is still expired can be taken
+                match = match.filter(RowShard.lease_expires_at < now)
+            if shard.attempts >= app.config['FANOUT_MAX_ATTEMPTS']:
+                if match.update({'state': 'failed', 'finished_at': now, 'lease_token': None,
+                                 'error': shard.error or f"Lease expired {shard.attempts} times"},
+                                synchronize_session=False):
+                    db.session.commit()
+                    self._publish(shard_id)
+                continue
+            token = uuid.uuid4().hex
+            claimed = match.update({
+                'state': 'leased',
+                'owner': f"{self.owner}:{threading.current_thread().name}",
+                'lease_token': token,
+                'lease_expires_at': now + timedelta(seconds=app.config['FANOUT_LEASE_SECONDS']),
+                'attempts': RowShard.attempts + 1,
+                'started_at': now,
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                if state == 'leased':
+                    logging.warning(f"⚠️ Took over shard {shard_id} from {previous_owner}, whose lease expired")
+                return shard_id, token
+        return None
+
+    def _run(self, shard_id, token):
+        from utils.processor import ArticleProcessor
+        shard = db.session.get(RowShard, shard_id)
+        target = load_targets(app.config)[shard.target]
+        self._publish(shard_id)
+        logging.info(f"▶️ Shard {shard_id} of run {shard.run_id}: {target.name} rows {shard.start_row}-{shard.end_row}")
+        tracker = ShardTracker(shard, token)
+        values = {'finished_at': datetime.utcnow()}
+        try:
+            ArticleProcessor(shard.mode, tracker=tracker, force=bool(shard.force), profile=app.config['PROFILE_RUNS'],
+                             target=target).run_processor((shard.start_row, shard.end_row))
+            if not tracker.started:
+                raise RuntimeError("Sheet rows could not be read")
+            values.update(state='done', error=None)
+        except Exception as e:
+            logging.error(f"❌ Shard {shard_id} failed: {str(e)}")
+            db.session.rollback()
+            # Retried by whichever worker claims it next, up to FANOUT_MAX_ATTEMPTS
+            retry = shard.attempts < app.config['FANOUT_MAX_ATTEMPTS']
+            values.update(state='pending' if retry else 'failed', error=str(e), lease_token=None,
+                          finished_at=None if retry else values['finished_at'])
+
+        # A no-op when the lease was lost; the shard then belongs to whoever holds it now
+        finished = RowShard.query.filter_by(id=shard_id, lease_token=token, state='leased').update(
+            values, synchronize_session=False)
+        db.session.commit()
+        self._publish(shard_id)
+        logging.info(f"⏹ Shard {shard_id} finished: {values['state'] if finished else 'lease lost'}")
+
+    def _publish(self, shard_id):
+        shard = db.session.get(RowShard, shard_id)
+        if shard:
+            db.session.refresh(shard)
+            events.publish('shard', shard.to_dict())
+
+shard_queue = ShardQueue()
+_submit_lock = threading.Lock()
+
+def shard_ranges(row_count, size):
+    # Data rows start below the header row; (start, end) inclusive
+    return [(start, min(start + size - 1, row_count)) for start in range(2, row_count + 1, size)]
+
+def submit_run(names=None, mode='sequential', force=False):
+    # Splits every selected target's tab into shards and queues them under one run id. Rows are counted
+    # from the tab's grid size, so trailing blank rows cost one cheap shard read each.
+    targets = load_targets(app.config)
+    if not targets:
+        raise ValueError("FANOUT_TARGETS is not configured")
+    unknown = [name for name in names or () if name not in targets]
+    if unknown:
+        raise ValueError(f"Unknown fan-out target(s): {', '.join(unknown)}")
+    selected = [targets[name] for name in names] if names else list(targets.values())
+
+    shard_queue.ensure_started()
+    google = clients.google_api(meta_ttl=app.config['SHEETS_META_TTL'])
+    with _submit_lock:
+        active = RowShard.query.filter(
+            RowShard.state.in_(ACTIVE_STATES),
+            RowShard.target.in_([t.name for t in selected]),
+        ).all()
+        if active:
+            raise FanoutConflict(active[0].run_id, {s.target for s in active})
+
+        run_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        shards = []
+        for target in selected:
+            props = google.get_sheet_properties(target.spreadsheet_id, target.tab)
+            row_count = props.get('gridProperties', {}).get('rowCount', 0)
+            for seq, (start, end) in enumerate(shard_ranges(row_count, app.config['FANOUT_SHARD_ROWS'])):
+                shards.append(RowShard(run_id=run_id, target=target.name, seq=seq, spreadsheet_id=target.spreadsheet_id,
+                                       sheet_name=props['title'], start_row=start, end_row=end, mode=mode,
+                                       force=force, state='pending', created_at=now))
+        db.session.add_all(shards)
+        db.session.commit()
+
+    logging.info(f"📬 Queued fan-out run {run_id}: {len(shards)} shard(s) across " +
+                 ', '.join(t.name for t in selected) + f" ({mode})")
+    shard_queue.notify()
+    return run_status(run_id)
+
+def run_status(run_id, include_shards=False):
+    shards = RowShard.query.filter_by(run_id=run_id).order_by(RowShard.target, RowShard.start_row).all()
+    if not shards:
+        return None
+    per_target = {}
+    for shard in shards:
+        summary = per_target.setdefault(shard.target, {'sheet_name': shard.sheet_name, 'shards': {},
+                                                       **{column: 0 for column in ROW_COLUMNS}})
+        summary['shards'][shard.state] = summary['shards'].get(shard.state, 0) + 1
+        for column in ROW_COLUMNS:
+            summary[column] += getattr(shard, column) or 0
+
+    states = {shard.state for shard in shards}
+    if states & set(ACTIVE_STATES):
+        state = 'running'
+    else:
+        state = next((s for s in ('failed', 'cancelled') if s in states), 'done')
+    status = {'run_id': run_id, 'state': state, 'mode': shards[0].mode, 'force': shards[0].force, 'targets': per_target}
+    if include_shards:
+        status['shards'] = [shard.to_dict() for shard in shards]
+    return status
+
+def cancel_run(run_id):
+    # Pending shards are dropped; a worker holding a lease sees the change before its next row
+    cancelled = RowShard.query.filter(RowShard.run_id == run_id, RowShard.state.in_(ACTIVE_STATES)).update(
+        {'state': 'cancelled', 'finished_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if cancelled:
+        logging.info(f"🛑 Cancelled {cancelled} shard(s) of fan-out run {run_id}")
+    return run_status(run_id)
@@ -1,46 +1,234 @@
 import os
+import random
+import time
 import logging
+import threading
+import httplib2
+import google_auth_httplib2
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from google.auth.transport.requests import Request
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from utils.doc_renderer import DocRenderer
+from utils.rate_limit import limiter, parse_retry_after, THROTTLE_STATUSES
+from utils.metrics import metrics
 
 SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets',
     'https://www.googleapis.com/auth/documents.readonly',
     'https://www.googleapis.com/auth/drive.readonly'
 ]
+SERVICE_ACCOUNT_FILE = 'service_account_sheets.json'
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+def col_to_a1(index):
+    # 0-based column index -> A1 letters (0 -> A, 25 -> Z, 26 -> AA)
+    letters = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def a1_range(sheet_name, cell_ref):
+    return f"'{sheet_name.replace(chr(39), chr(39) * 2)}'!{cell_ref}"
+
+DRIVE_BATCH_SIZE = 100
+DOCS_BATCH_SIZE = 50
+DOCS_BATCH_RETRIES = 4
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+EXECUTE_RETRIES = 3
+# A write batch that is still throttled after EXECUTE_RETRIES waits this long before it is sent again
+WRITE_RETRY_SECONDS = 15
+FINAL_FLUSH_ATTEMPTS = 3
+
+class TTLCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item and time.monotonic() - item[0] < self.ttl:
+                return item[1]
+            self._items.pop(key, None)
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+def is_throttle(error):
+    # Quota errors are 429 (Sheets, Docs) or 403 with a rate-limit reason (Drive); 503 means overloaded
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status in THROTTLE_STATUSES:
+        return True
+    return error.resp.status == 403 and 'ratelimitexceeded' in str(error).lower()
+
+def api_for(uri):
+    # Metrics label for a Google API URL; batch endpoints count against the API inside them
+    path = urlsplit(uri).path
+    if path.startswith('/v4/spreadsheets'):
+        return 'sheets'
+    if path.startswith(('/drive/', '/batch/drive/')):
+        return 'drive'
+    if path.startswith(('/v1/documents', '/batch')):
+        return 'docs'
+    return urlsplit(uri).hostname or 'google'
+
+class MeteredHttp(httplib2.Http):
+    # Counts every round trip and its body sizes in utils.metrics
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        api = api_for(uri)
+        try:
+            resp, content = super().request(uri, method, body, headers, *args, **kwargs)
+        except Exception:
+            metrics.record_http(api, 'error', len(body or ''))
+            raise
+        metrics.record_http(api, resp.status, len(body or ''), len(content or b''))
+        return resp, content
+
+class GoogleServices:
+    # Credentials plus built Sheets/Docs/Drive clients. Building is the expensive part of start-up
+    # (service-account parsing, discovery documents), so one instance is meant to be shared per process.
+    def __init__(self, creds):
+        self.creds = creds
+        self.timings = {}
+        self._token_lock = threading.Lock()
+        self._local = threading.local()
+        started = time.perf_counter()
+        # static_discovery uses the discovery documents shipped inside google-api-python-client,
+        # so building never goes to the network
+        self.sheets = self._build('sheets', 'v4')
+        self.docs = self._build('docs', 'v1')
+        self.drive = self._build('drive', 'v3')
+        self.timings['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    @classmethod
+    def from_service_account(cls, service_account_file=SERVICE_ACCOUNT_FILE):
+        if not os.path.exists(service_account_file):
+            logging.error(f"❌ Service account file not found: {service_account_file}")
+            return None
+        started = time.perf_counter()
+        creds = Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
+        services = cls(creds)
+        services.timings['credentials_ms'] = round((time.perf_counter() - started) * 1000 - services.timings['total_ms'], 1)
+        logging.info("✅ Authenticated with Google successfully.")
+        return services
+
+    def _build(self, name, version):
+        started = time.perf_counter()
+        service = build(name, version, credentials=self.creds, requestBuilder=self._build_request,
+                        static_discovery=True, cache_discovery=False)
+        self.timings[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return service
+
+    def ensure_token(self):
+        # Refresh ahead of expiry under a lock, so concurrent requests don't each refresh the same token
+        expiry = self.creds.expiry
+        if self.creds.token and expiry and expiry - datetime.utcnow() > TOKEN_REFRESH_MARGIN:
+            return
+        with self._token_lock:
+            expiry = self.creds.expiry
+            if self.creds.token and expiry and expiry - datetime.utcnow() > TOKEN_REFRESH_MARGIN:
+                return
+            self.creds.refresh(Request())
+            logging.debug(f"🔑 Refreshed Google access token (expires {self.creds.expiry})")
+
+    def _new_http(self):
+        return google_auth_httplib2.AuthorizedHttp(self.creds, http=MeteredHttp())
+
+    def _thread_http(self):
+        # httplib2.Http is not thread-safe, so each thread keeps its own and reuses its connections
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = self._new_http()
+        return http
+
+    def _build_request(self, http, *args, **kwargs):
+        self.ensure_token()
+        return HttpRequest(self._thread_http(), *args, **kwargs)
 
 class GoogleAPI:
-    def __init__(self):
+    # Shared by every instance in the process; sheet layout rarely changes within a few minutes
+    meta_cache = TTLCache(300)
+    header_cache = TTLCache(300)
+
+    def __init__(self, write_batch_size=50, write_flush_seconds=10, doc_cache=None, meta_ttl=None, services=None):
         self.creds = None
         self.sheets_service = None
         self.docs_service = None
         self.drive_service = None
-        self._authenticate()
+        self.write_batch_size = write_batch_size
+        self.write_flush_seconds = write_flush_seconds
+        self._pending_writes = []
+        self._write_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._retry_writes_at = 0
+        # Set by the processor to re-host images that only have an expiring contentUri
+        self.image_url = None
+        self.doc_cache = doc_cache
+        if meta_ttl is not None:
+            self.meta_cache.ttl = self.header_cache.ttl = meta_ttl
+        if services:
+            self._use_services(services)
+        else:
+            self._authenticate()
+
+    def _use_services(self, services):
+        self.creds = services.creds
+        self.sheets_service = services.sheets
+        self.docs_service = services.docs
+        self.drive_service = services.drive
 
     def _authenticate(self):
         try:
-            service_account_file = 'service_account_sheets.json'
-            if os.path.exists(service_account_file):
-                self.creds = Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
-                logging.info("✅ Authenticated with Google successfully.")
-            else:
-                logging.error(f"❌ Service account file not found: {service_account_file}")
-                return
-            self.sheets_service = build('sheets', 'v4', credentials=self.creds)
-            self.docs_service = build('docs', 'v1', credentials=self.creds)
-            self.drive_service = build('drive', 'v3', credentials=self.creds)
+            services = GoogleServices.from_service_account()
+            if services:
+                self._use_services(services)
         except Exception as e:
             logging.error(f"❌ Authentication failed: {str(e)}")
             raise
 
+    def _execute(self, request, api):
+        # Paced by the shared bucket for `api`; throttling answers shrink that bucket's rate and,
+        # like 5xx answers, are retried
+        bucket = limiter.bucket(api)
+        for attempt in range(EXECUTE_RETRIES + 1):
+            bucket.acquire()
+            try:
+                result = request.execute()
+            except HttpError as e:
+                throttled = is_throttle(e)
+                if throttled:
+                    bucket.throttle(parse_retry_after(e.resp.get('retry-after')))
+                if attempt == EXECUTE_RETRIES or not (throttled or e.resp.status in RETRYABLE_STATUSES):
+                    raise
+                delay = random.uniform(0, min(30, 2 ** attempt))
+                metrics.record_retry(api.split('_')[0])
+                logging.warning(f"🔁 {api} request failed (HTTP {e.resp.status}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            bucket.success()
+            return result
+
     def get_sheet_data(self, spreadsheet_id, range_name):
         logging.debug(f"📄 Fetching sheet data for range: {range_name}")
         try:
-            result = self.sheets_service.spreadsheets().values().get(
+            result = self._execute(self.sheets_service.spreadsheets().values().get(
                 spreadsheetId=spreadsheet_id,
                 range=range_name
-            ).execute()
+            ), 'sheets_read')
             return result.get('values', [])
         except HttpError as http_err:
             logging.error(f"❌ HTTP error fetching sheet data: {http_err}")
@@ -49,90 +237,201 @@ class GoogleAPI:
             logging.error(f"❌ Error fetching sheet data: {str(e)}")
             return []
 
+    def get_spreadsheet_meta(self, spreadsheet_id):
+        meta = self.meta_cache.get(spreadsheet_id)
+        if meta is None:
+            logging.debug(f"📄 Fetching spreadsheet metadata for {spreadsheet_id}")
+            meta = self._execute(self.sheets_service.spreadsheets().get(
+                spreadsheetId=spreadsheet_id,
+                fields='sheets.properties(sheetId,title,gridProperties(rowCount,columnCount))'
+            ), 'sheets_read')
+            self.meta_cache.set(spreadsheet_id, meta)
+        return meta
+
+    def get_sheet_properties(self, spreadsheet_id, sheet_title=None):
+        sheets = self.get_spreadsheet_meta(spreadsheet_id).get('sheets', [])
+        for sheet in sheets:
+            if sheet_title is None or sheet['properties']['title'] == sheet_title:
+                return sheet['properties']
+        raise ValueError(f"Sheet '{sheet_title}' not found in spreadsheet {spreadsheet_id}")
+
+    def get_rows(self, spreadsheet_id, sheet_title, start_row=2, end_row=None):
+        # Header row plus only the requested rows, across every column the sheet has, in one batchGet.
+        # Returns (headers, [(row_number, values), ...]).
+        props = self.get_sheet_properties(spreadsheet_id, sheet_title)
+        last_col = col_to_a1(max(props.get('gridProperties', {}).get('columnCount', 26), 1) - 1)
+        start_row = max(start_row or 2, 2)
+        data_range = a1_range(sheet_title, f"A{start_row}:{last_col}{end_row or ''}")
+        header_key = (spreadsheet_id, sheet_title, last_col)
+        headers = self.header_cache.get(header_key)
+
+        ranges = [data_range] if headers is not None else [a1_range(sheet_title, f"A1:{last_col}1"), data_range]
+        logging.debug(f"📄 Fetching sheet ranges: {ranges}")
+        result = self._execute(self.sheets_service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=ranges
+        ), 'sheets_read')
+        value_ranges = result.get('valueRanges', [])
+        if headers is None:
+            header_values = value_ranges[0].get('values', []) if value_ranges else []
+            headers = header_values[0] if header_values else []
+            self.header_cache.set(header_key, headers)
+            value_ranges = value_ranges[1:]
+        values = value_ranges[0].get('values', []) if value_ranges else []
+        return headers, list(enumerate(values, start=start_row))
+
     def update_cell(self, spreadsheet_id, sheet_name, cell_ref, value):
         logging.debug(f"✏️ Updating cell {cell_ref} to: {value}")
         try:
-            self.sheets_service.spreadsheets().values().update(
+            self._execute(self.sheets_service.spreadsheets().values().update(
                 spreadsheetId=spreadsheet_id,
                 range=f"{sheet_name}!{cell_ref}",
                 valueInputOption="RAW",
                 body={"values": [[value]]}
-            ).execute()
+            ), 'sheets_write')
             logging.info(f"✅ Updated cell {cell_ref} with value: {value}")
         except Exception as e:
             logging.error(f"❌ Error updating cell {cell_ref}: {str(e)}")
 
-    def get_doc_content(self, doc_id):
-        logging.debug(f"📝 Fetching Google Doc content for doc ID: {doc_id}")
-        try:
-            document = self.docs_service.documents().get(documentId=doc_id).execute()
-            content = []
-            h1_skipped = False
-            list_stack = []
-
-            def get_tag(style):
-                if style.get('heading') == 'HEADING_1':
-                    return 'h1'
-                elif style.get('heading') == 'HEADING_2':
-                    return 'h2'
-                elif style.get('heading') == 'HEADING_3':
-                    return 'h3'
-                return 'p'
-
-            for element in document.get('body', {}).get('content', []):
-                if 'paragraph' not in element:
-                    continue
+    def queue_cell_update(self, spreadsheet_id, sheet_name, row, col, value):
+        with self._write_lock:
+            self._pending_writes.append({
+                'spreadsheet_id': spreadsheet_id,
+                'range': a1_range(sheet_name, f"{col_to_a1(col)}{row}"),
+                'row': row,
+                'value': value,
+            })
+            now = time.monotonic()
+            due = now >= self._retry_writes_at and (len(self._pending_writes) >= self.write_batch_size or
+                                                    now - self._last_flush >= self.write_flush_seconds)
+        return self.flush_updates() if due else []
+
+    def flush_updates(self, final=False):
+        # Writes whose batch was throttled or hit a 5xx stay queued for a later flush rather than being split
+        # into one request per cell against a quota that is already used up. The final flush of a run tries
+        # FINAL_FLUSH_ATTEMPTS times before reporting them as failed. Returns the failed writes.
+        failures = []
+        attempts = FINAL_FLUSH_ATTEMPTS if final else 1
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(WRITE_RETRY_SECONDS)
+            flushed, deferred = self._flush_pending()
+            failures += flushed
+            if not deferred:
+                break
+            if attempt == attempts - 1 and final:
+                failures += [{'row': w['row'], 'range': w['range'], 'error': 'Sheets is throttling writes'} for w in deferred]
+                break
+            with self._write_lock:
+                self._pending_writes[:0] = deferred
+                self._retry_writes_at = time.monotonic() + WRITE_RETRY_SECONDS
+        return failures
 
-                para = element['paragraph']
-                style = para.get('paragraphStyle', {})
-                tag = get_tag(style)
+    def _flush_pending(self):
+        # Returns (failed writes, writes to retry later)
+        with self._write_lock:
+            pending, self._pending_writes = self._pending_writes, []
+            self._last_flush = time.monotonic()
+        if not pending:
+            return [], []
 
-                if tag == 'h1' and not h1_skipped:
-                    h1_skipped = True
+        failures, deferred = [], []
+        by_sheet = {}
+        for write in pending:
+            by_sheet.setdefault(write['spreadsheet_id'], []).append(write)
+
+        for spreadsheet_id, writes in by_sheet.items():
+            logging.debug(f"✏️ Flushing {len(writes)} cell updates to {spreadsheet_id}")
+            try:
+                self._execute(self.sheets_service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=spreadsheet_id,
+                    body={
+                        "valueInputOption": "RAW",
+                        "data": [{"range": w['range'], "values": [[w['value']]]} for w in writes]
+                    }
+                ), 'sheets_write')
+                logging.info(f"✅ Flushed {len(writes)} cell updates")
+            except Exception as e:
+                if not isinstance(e, HttpError) or is_throttle(e) or e.resp.status in RETRYABLE_STATUSES:
+                    logging.warning(f"⚠️ Batch cell update failed, keeping {len(writes)} writes queued: {str(e)}")
+                    deferred += writes
                     continue
+                # batchUpdate is all-or-nothing; a rejected batch is retried cell by cell to find out which ones fail
+                logging.error(f"❌ Batch cell update failed, retrying per cell: {str(e)}")
+                for w in writes:
+                    try:
+                        self._execute(self.sheets_service.spreadsheets().values().update(
+                            spreadsheetId=spreadsheet_id,
+                            range=w['range'],
+                            valueInputOption="RAW",
+                            body={"values": [[w['value']]]}
+                        ), 'sheets_write')
+                    except Exception as cell_err:
+                        logging.error(f"❌ Error updating cell {w['range']}: {str(cell_err)}")
+                        failures.append({'row': w['row'], 'range': w['range'], 'error': str(cell_err)})
+        return failures, deferred
 
-                if 'bullet' in para:
-                    list_tag = 'ul'
-                    if style.get('namedStyleType', '').startswith('NUMBERED'):
-                        list_tag = 'ol'
-                    if not list_stack or list_stack[-1] != list_tag:
-                        if list_stack:
-                            content.append(f"</{list_stack.pop()}>")
-                        content.append(f"<{list_tag}>")
-                        list_stack.append(list_tag)
-                    tag = 'li'
-                else:
-                    while list_stack:
-                        content.append(f"</{list_stack.pop()}>")
-
-                line = ""
-                for elem in para.get('elements', []):
-                    text_run = elem.get('textRun', {})
-                    text = text_run.get('content', '').replace('\n', '')
-                    style = text_run.get('textStyle', {})
-
-                    if not text.strip():
-                        continue
-                    if style.get('bold'):
-                        text = f"<strong>{text}</strong>"
-                    if style.get('italic'):
-                        text = f"<em>{text}</em>"
-                    if style.get('underline'):
-                        text = f"<u>{text}</u>"
-                    if style.get('link'):
-                        url = style['link'].get('url', '#')
-                        text = f'<a href="{url}" target="_blank">{text}</a>'
-
-                    line += text
-
-                if line.strip():
-                    content.append(f"<{tag}>{line.strip()}</{tag}>")
-
-            while list_stack:
-                content.append(f"</{list_stack.pop()}>")
-
-            html = "\n".join(content).strip()
-            logging.debug(f"✅ Converted Google Doc to HTML ({len(content)} blocks)")
+    def _revision_request(self, doc_id):
+        return self.drive_service.files().get(
+            fileId=doc_id,
+            fields='version,modifiedTime',
+            supportsAllDrives=True
+        )
+
+    def get_doc_revision(self, doc_id):
+        # Metadata-only call: a few hundred bytes instead of the full document body
+        meta = self._execute(self._revision_request(doc_id), 'drive')
+        return f"{meta.get('version')}:{meta.get('modifiedTime')}"
+
+    def get_doc_revisions(self, doc_ids):
+        # Same as get_doc_revision for many docs, DRIVE_BATCH_SIZE per HTTP round trip.
+        # Docs whose metadata could not be read are left out of the result.
+        revisions = {}
+        bucket = limiter.bucket('drive')
+        throttled = []
+
+        def callback(request_id, response, exception):
+            if exception:
+                if is_throttle(exception):
+                    throttled.append(request_id)
+                logging.warning(f"⚠️ Revision lookup failed for doc {request_id}: {exception}")
+                return
+            revisions[request_id] = f"{response.get('version')}:{response.get('modifiedTime')}"
+            bucket.success()
+
+        unique = list(dict.fromkeys(doc_ids))
+        for start in range(0, len(unique), DRIVE_BATCH_SIZE):
+            chunk = unique[start:start + DRIVE_BATCH_SIZE]
+            batch = self.drive_service.new_batch_http_request(callback=callback)
+            for doc_id in chunk:
+                batch.add(self._revision_request(doc_id), request_id=doc_id)
+            # Every request inside a batch counts against the quota on its own
+            bucket.acquire(len(chunk))
+            del throttled[:]
+            try:
+                batch.execute()
+                if throttled:
+                    bucket.throttle()
+            except Exception as e:
+                logging.error(f"❌ Revision batch failed: {str(e)}")
+        return revisions
+
+    def get_doc_content(self, doc_id, revision=None):
+        logging.debug(f"📝 Fetching Google Doc content for doc ID: {doc_id}")
+        if self.doc_cache:
+            try:
+                revision = revision or self.get_doc_revision(doc_id)
+                html = self.doc_cache.get(doc_id, revision)
+                if html is not None:
+                    logging.debug(f"♻️ Using cached HTML for doc {doc_id} (revision {revision})")
+                    return html
+            except Exception as e:
+                logging.warning(f"⚠️ Doc revision check failed for {doc_id}, fetching full document: {str(e)}")
+        try:
+            document = self._execute(self.docs_service.documents().get(documentId=doc_id), 'docs')
+            html = self.render_document(document)
+            if self.doc_cache and revision:
+                self.doc_cache.put(doc_id, revision, html)
             return html
         except HttpError as http_err:
             logging.error(f"❌ HTTP error fetching doc {doc_id}: {http_err}")
@@ -140,3 +439,81 @@ class GoogleAPI:
         except Exception as e:
             logging.error(f"❌ Error fetching doc content ({doc_id}): {str(e)}")
             raise
+
+    def get_docs_content(self, doc_ids, revisions=None):
+        # Bulk get_doc_content: cache hits first, then documents().get for the rest multiplexed through
+        # BatchHttpRequest. Items that hit quota or 5xx errors are retried with backoff.
+        # Returns ({doc_id: html}, {doc_id: exception}).
+        results, errors = {}, {}
+        pending = list(dict.fromkeys(doc_ids))
+        revisions = dict(revisions or {})
+        bucket = limiter.bucket('docs')
+
+        if self.doc_cache and pending:
+            missing = [d for d in pending if not revisions.get(d)]
+            if missing:
+                revisions.update(self.get_doc_revisions(missing))
+            for doc_id in list(pending):
+                html = self.doc_cache.get(doc_id, revisions.get(doc_id)) if revisions.get(doc_id) else None
+                if html is not None:
+                    results[doc_id] = html
+                    pending.remove(doc_id)
+            if results:
+                logging.debug(f"♻️ {len(results)} docs served from cache")
+
+        for attempt in range(DOCS_BATCH_RETRIES + 1):
+            if not pending:
+                break
+            retry = []
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    try:
+                        html = self.render_document(response)
+                    except Exception as e:
+                        errors[request_id] = e
+                        return
+                    results[request_id] = html
+                    errors.pop(request_id, None)
+                    bucket.success()
+                    if self.doc_cache and revisions.get(request_id):
+                        self.doc_cache.put(request_id, revisions[request_id], html)
+                elif isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_STATUSES:
+                    retry.append(request_id)
+                    errors[request_id] = exception
+                else:
+                    errors[request_id] = exception
+
+            for start in range(0, len(pending), DOCS_BATCH_SIZE):
+                batch = self.docs_service.new_batch_http_request(callback=callback)
+                chunk = pending[start:start + DOCS_BATCH_SIZE]
+                for doc_id in chunk:
+                    batch.add(self.docs_service.documents().get(documentId=doc_id), request_id=doc_id)
+                bucket.acquire(len(chunk))
+                retried = len(retry)
+                try:
+                    batch.execute()
+                    if any(is_throttle(errors[d]) for d in retry[retried:]):
+                        bucket.throttle()
+                except Exception as e:
+                    logging.error(f"❌ Docs batch request failed: {str(e)}")
+                    for doc_id in chunk:
+                        if doc_id not in results:
+                            errors[doc_id] = e
+                            retry.append(doc_id)
+
+            pending = list(dict.fromkeys(retry))
+            if pending and attempt < DOCS_BATCH_RETRIES:
+                delay = random.uniform(0, min(30, 2 ** attempt))
+                metrics.record_retry('docs', len(pending))
+                logging.warning(f"🔁 Retrying {len(pending)} docs after quota/server errors in {delay:.1f}s")
+                time.sleep(delay)
+
+        logging.debug(f"✅ Fetched {len(results)} docs, {len(errors)} failed")
+        return results, errors
+
+    def render_document(self, document):
+        renderer = DocRenderer(document, image_url=self.image_url)
+        html = renderer.render()
+        logging.debug(f"✅ Converted Google Doc to HTML ({renderer.blocks} blocks)")
+        return html
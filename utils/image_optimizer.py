@@ -0,0 +1,169 @@
+import hashlib, io, logging, multiprocessing, os, shutil, threading
+from concurrent.futures import ProcessPoolExecutor
+from utils.media import SpooledImage
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+}
+# Left alone: re-encoding would drop animation frames
+SKIP_TYPES = ('image/gif',)
+# Cached "the original was already smaller" answers
+KEEP_SUFFIX = '.keep'
+
+def optimize_image(source, size, max_width, fmt, quality):
+    # Runs in a worker process. source is a file path, or the bytes of an image small enough to be kept
+    # in memory. Downscales to max_width, re-encodes without EXIF/XMP/ICC metadata and returns the new
+    # bytes, or None when that doesn't make the file smaller than size.
+    from PIL import Image, ImageOps
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as im:
+        if getattr(im, 'is_animated', False):
+            return None
+        im = ImageOps.exif_transpose(im)
+        if im.width > max_width:
+            im = im.resize((max_width, max(1, round(im.height * max_width / im.width))), Image.LANCZOS)
+        has_alpha = im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
+        if fmt == 'jpeg':
+            if has_alpha:
+                rgba = im.convert('RGBA')
+                im = Image.new('RGB', rgba.size, (255, 255, 255))
+                im.paste(rgba, mask=rgba.getchannel('A'))
+            elif im.mode != 'RGB':
+                im = im.convert('RGB')
+        elif im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGBA' if has_alpha else 'RGB')
+
+        out = io.BytesIO()
+        if fmt == 'jpeg':
+            im.save(out, format='JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            im.save(out, format='WEBP', quality=quality, method=4)
+    result = out.getvalue()
+    return result if len(result) < size else None
+
+class ImageOptimizer:
+    # Shrinks images before upload in a process pool, so Pillow's CPU work doesn't hold the GIL that
+    # the I/O threads need. Results are cached on disk by source hash and settings.
+    def __init__(self, max_width=1600, fmt='webp', quality=82, workers=2, cache_dir='cache/images',
+                 max_cache_bytes=500 * 1024 * 1024):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported image format: {fmt}")
+        self.max_width = max_width
+        self.fmt = fmt
+        self.quality = quality
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.signature = f"{fmt}-w{max_width}-q{quality}"
+        self._pool = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # forkserver: forking this multi-threaded process directly is not safe
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+                logging.info(f"🖼 Image optimizer started with {self.workers} worker process(es)")
+            return self._pool
+
+    def _path(self, sha256, suffix):
+        return os.path.join(self.cache_dir, f"{sha256}.{self.signature}{suffix}")
+
+    def _cached(self, sha256):
+        # (found, bytes or None)
+        if os.path.exists(self._path(sha256, KEEP_SUFFIX)):
+            return True, None
+        path = self._path(sha256, FORMATS[self.fmt][2])
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False, None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True, data
+
+    def _store(self, sha256, data):
+        path = self._path(sha256, FORMATS[self.fmt][2] if data else KEEP_SUFFIX)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data or b'')
+        os.replace(tmp, path)
+        if data:
+            self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        # Least recently used first, by mtime
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, os.path.join(self.cache_dir, name), st.st_size))
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def optimize(self, image):
+        # SpooledImage in; a smaller SpooledImage out, or None to upload the original
+        if image.content_type in SKIP_TYPES:
+            return None
+        found, data = self._cached(image.sha256)
+        if not found:
+            data = self._optimize(image)
+            self._store(image.sha256, data)
+        if not data:
+            return None
+        return SpooledImage(io.BytesIO(data), len(data), FORMATS[self.fmt][1], hashlib.sha256(data).hexdigest())
+
+    def _optimize(self, image):
+        if not image.on_disk:
+            return self._executor().submit(optimize_image, image.file.getvalue(), image.size,
+                                           self.max_width, self.fmt, self.quality).result()
+        # A spooled image is an anonymous temp file; the worker gets a named copy to read by path
+        # instead of the whole image pickled through the pipe
+        path = os.path.join(self.cache_dir, f"{image.sha256}.{threading.get_ident()}.src.tmp")
+        try:
+            image.file.seek(0)
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(image.file, f)
+            return self._executor().submit(optimize_image, path, image.size,
+                                           self.max_width, self.fmt, self.quality).result()
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+_optimizer = None
+_optimizer_lock = threading.Lock()
+
+def image_optimizer(config):
+    # One optimizer (and process pool) per process; None when Pillow isn't installed
+    global _optimizer
+    with _optimizer_lock:
+        if _optimizer is None:
+            try:
+                import PIL  # noqa: F401
+            except ImportError:
+                logging.warning("⚠️ IMAGE_OPTIMIZE is on but Pillow is not installed; uploading images as they are")
+                return None
+            _optimizer = ImageOptimizer(config['IMAGE_MAX_WIDTH'], config['IMAGE_FORMAT'], config['IMAGE_QUALITY'],
+                                        config['IMAGE_OPTIMIZE_WORKERS'], config['IMAGE_CACHE_DIR'],
+                                        config['IMAGE_CACHE_MAX_BYTES'])
+    return _optimizer
@@ -0,0 +1,196 @@
+import logging, threading, uuid
+from datetime import datetime, timedelta
+from app import app, db
+from models import Job
+from utils.events import events
+
+ACTIVE_STATES = ('queued', 'running')
+FINAL_STATES = ('done', 'failed', 'cancelled')
+OUTCOME_COLUMNS = {'success': 'succeeded_rows', 'error': 'failed_rows', 'skipped': 'skipped_rows'}
+
+class JobConflict(Exception):
+    def __init__(self, job):
+        super().__init__(f"Rows overlap with job {job.id} ({job.start_row}-{job.end_row}, {job.state})")
+        self.job = job
+
+class RowTracker:
+    # The tracker interface ArticleProcessor reports to, over a model with the row counter columns.
+    # Subclasses set model and implement _update, cancelled and _row_event.
+    model = None
+    started = False
+
+    def start(self, total):
+        self.started = True
+        self._update({'total_rows': total})
+
+    def row_done(self, row, outcome):
+        values = {'processed_rows': self.model.processed_rows + 1}
+        column = OUTCOME_COLUMNS.get(outcome)
+        if column:
+            values[column] = getattr(self.model, column) + 1
+        self._update(values)
+        events.publish('row', {**self._row_event(), 'row': row, 'outcome': outcome})
+
+class JobTracker(RowTracker):
+    # Writes are fenced by the claim's started_at: once the job was re-queued as stale (and maybe claimed
+    # again), this worker's updates match nothing and it sees a cancellation before its next row
+    model = Job
+
+    def __init__(self, job_id, lease):
+        self.job_id = job_id
+        self.lease = lease
+
+    def _row_event(self):
+        return {'job_id': self.job_id}
+
+    def cancelled(self):
+        # Checked before every row, so it also renews the heartbeat while finished rows wait in the post queue
+        held = Job.query.filter_by(id=self.job_id, state='running', started_at=self.lease).update(
+            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return not held or bool(db.session.query(Job.cancel_requested).filter_by(id=self.job_id).scalar())
+
+    def _update(self, values):
+        # Counters are incremented in SQL so concurrent row threads never lose an update
+        values['heartbeat_at'] = datetime.utcnow()
+        held = Job.query.filter_by(id=self.job_id, state='running', started_at=self.lease).update(
+            values, synchronize_session=False)
+        db.session.commit()
+        if held:
+            publish_job(db.session.get(Job, self.job_id))
+
+class WorkerQueue:
+    # Worker threads that claim work from the database. Subclasses set kind and workers_setting (the config
+    # key for the thread count) and implement _claim_next, returning the arguments for _run or None.
+    kind = None
+    workers_setting = None
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(app.config[self.workers_setting]):
+                t = threading.Thread(target=self._worker, name=f"{self.kind}-worker-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            logging.info(f"🧵 Started {len(self._threads)} {self.kind} worker(s){self._started_note()}")
+
+    def _started_note(self):
+        return ''
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _worker(self):
+        while True:
+            try:
+                with app.app_context():
+                    claimed = self._claim_next()
+                    if claimed:
+                        self._run(*claimed)
+                        continue
+            except Exception as e:
+                logging.error(f"❌ {self.kind.capitalize()} worker error: {str(e)}")
+            # Wait for a local submission, or wake up periodically for work queued by other processes
+            self._wakeup.wait(timeout=5)
+            self._wakeup.clear()
+
+class JobQueue(WorkerQueue):
+    kind = 'job'
+    workers_setting = 'JOB_WORKERS'
+
+    def _claim_next(self):
+        requeue_stale_jobs()
+        job = Job.query.filter_by(state='queued').order_by(Job.created_at).first()
+        if not job:
+            return None
+        # started_at doubles as the lease token; whole seconds so every database stores it exactly
+        now = datetime.utcnow().replace(microsecond=0)
+        job_id = job.id
+        claimed = Job.query.filter_by(id=job_id, state='queued').update(
+            {'state': 'running', 'started_at': now, 'heartbeat_at': now})
+        db.session.commit()
+        if claimed:
+            publish_job(db.session.get(Job, job_id))
+        return (job_id, now) if claimed else None
+
+    def _run(self, job_id, lease):
+        from utils.processor import ArticleProcessor
+        job = db.session.get(Job, job_id)
+        logging.info(f"▶️ Running job {job_id}: rows {job.start_row}-{job.end_row} ({job.mode})")
+        tracker = JobTracker(job_id, lease)
+        try:
+            ArticleProcessor(job.mode, tracker=tracker, force=bool(job.force),
+                             profile=app.config['PROFILE_RUNS']).run_processor((job.start_row, job.end_row))
+            state, error = ('cancelled' if tracker.cancelled() else 'done'), None
+        except Exception as e:
+            logging.error(f"❌ Job {job_id} failed: {str(e)}")
+            db.session.rollback()
+            state, error = 'failed', str(e)
+        # A no-op when the job was re-queued meanwhile; it then belongs to whoever claims it next
+        finished = Job.query.filter_by(id=job_id, state='running', started_at=lease).update(
+            {'state': state, 'error': error, 'finished_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        publish_job(db.session.get(Job, job_id))
+        logging.info(f"⏹ Job {job_id} finished: {state if finished else 'lease lost'}")
+
+def publish_job(job):
+    if job:
+        events.publish('job', job.to_dict())
+
+job_queue = JobQueue()
+_submit_lock = threading.Lock()
+
+def requeue_stale_jobs():
+    # A running job without a heartbeat belongs to a worker that died; put it back in the queue
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['JOB_STALE_SECONDS'])
+    stale = Job.query.filter(Job.state == 'running', Job.heartbeat_at < cutoff).update(
+        {'state': 'queued'}, synchronize_session=False)
+    if stale:
+        logging.warning(f"⚠️ Re-queued {stale} stale job(s)")
+    db.session.commit()
+
+def submit_job(start_row, end_row, mode='sequential', force=False):
+    job_queue.ensure_started()
+    with _submit_lock:
+        existing = Job.query.filter(
+            Job.state.in_(ACTIVE_STATES),
+            Job.start_row <= end_row,
+            Job.end_row >= start_row,
+        ).order_by(Job.created_at).first()
+        if existing:
+            if existing.start_row == start_row and existing.end_row == end_row:
+                return existing, False
+            raise JobConflict(existing)
+
+        job = Job(id=uuid.uuid4().hex, start_row=start_row, end_row=end_row, mode=mode, force=force, state='queued')
+        db.session.add(job)
+        db.session.commit()
+    logging.info(f"📬 Queued job {job.id}: rows {start_row}-{end_row} ({mode})")
+    publish_job(job)
+    job_queue.notify()
+    return job, True
+
+def get_job_status(job_id):
+    job_queue.ensure_started()
+    return db.session.get(Job, job_id)
+
+def request_cancel(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return None
+    if job.state == 'queued':
+        Job.query.filter_by(id=job_id, state='queued').update(
+            {'state': 'cancelled', 'cancel_requested': True, 'finished_at': datetime.utcnow()})
+    elif job.state == 'running':
+        Job.query.filter_by(id=job_id).update({'cancel_requested': True})
+    db.session.commit()
+    db.session.refresh(job)
+    publish_job(job)
+    logging.info(f"🛑 Cancel requested for job {job_id} ({job.state})")
+    return job
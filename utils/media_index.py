@@ -0,0 +1,56 @@
+import logging, threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from app import db
+from models import MediaAsset
+
+class MediaIndex:
+    def __init__(self, wp, verify_after_seconds=7 * 24 * 3600):
+        self.wp = wp
+        self.site_url = wp.site_url
+        self.verify_after = timedelta(seconds=verify_after_seconds)
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    def lock_for(self, key):
+        # Serialises rows that share an image so only the first one uploads it
+        with self._locks_guard:
+            return self._locks[key]
+
+    def find(self, drive_file_id=None, content_hash=None):
+        query = MediaAsset.query.filter_by(site_url=self.site_url)
+        if drive_file_id:
+            query = query.filter_by(drive_file_id=drive_file_id)
+        elif content_hash:
+            query = query.filter_by(content_hash=content_hash)
+        else:
+            return None
+
+        for asset in query.order_by(MediaAsset.verified_at.desc()).all():
+            if datetime.utcnow() - asset.verified_at < self.verify_after:
+                return asset.wordpress_media_id
+            exists = self.wp.media_exists(asset.wordpress_media_id)
+            if exists is False:
+                logging.info(f"🗑 Media {asset.wordpress_media_id} no longer exists, dropping it from the index")
+                db.session.delete(asset)
+                db.session.commit()
+                continue
+            if exists:
+                asset.verified_at = datetime.utcnow()
+                db.session.commit()
+            return asset.wordpress_media_id
+        return None
+
+    def record(self, media_id, drive_file_id=None, content_hash=None):
+        query = MediaAsset.query.filter_by(site_url=self.site_url)
+        if drive_file_id:
+            asset = query.filter_by(drive_file_id=drive_file_id).first()
+        else:
+            asset = query.filter_by(drive_file_id=None, content_hash=content_hash).first()
+        if not asset:
+            asset = MediaAsset(site_url=self.site_url, drive_file_id=drive_file_id)
+            db.session.add(asset)
+        asset.content_hash = content_hash
+        asset.wordpress_media_id = media_id
+        asset.verified_at = datetime.utcnow()
+        db.session.commit()
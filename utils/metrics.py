@@ -0,0 +1,169 @@
+import logging, threading, time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Upper bounds in seconds; an HTTP round trip lands in the low buckets, a whole row in the high ones
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RECENT_SPANS = 500
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[n] += 1
+                break
+
+    def cumulative(self):
+        total, out = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+class RowSpan:
+    # Where one row's time went: seconds per stage, accumulated from whichever threads worked on it
+    def __init__(self, row):
+        self.row = row
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.outcome = None
+        self.seconds = None
+
+    def to_dict(self):
+        return {
+            'row': self.row,
+            'started_at': self.started_at,
+            'seconds': round(self.seconds, 4) if self.seconds is not None else None,
+            'outcome': self.outcome,
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+        }
+
+class Metrics:
+    # Process-wide counters and histograms, rendered in the Prometheus text format by /metrics.
+    # Each gunicorn worker keeps its own, so scrape every worker or run a single one.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stage_seconds = defaultdict(Histogram)
+            self.row_seconds = Histogram()
+            self.rows = defaultdict(int)
+            self.http_requests = defaultdict(int)
+            self.http_retries = defaultdict(int)
+            self.http_bytes = defaultdict(int)
+            self.recent_spans = deque(maxlen=RECENT_SPANS)
+
+    @property
+    def current_span(self):
+        return getattr(self._local, 'span', None)
+
+    def start_row(self, row):
+        span = self._local.span = RowSpan(row)
+        return span
+
+    def finish_row(self, span, outcome):
+        if self.current_span is span:
+            self._local.span = None
+        if span is None or outcome is None:
+            return
+        span.outcome = outcome
+        span.seconds = time.perf_counter() - span._started
+        with self._lock:
+            self.rows[outcome] += 1
+            self.row_seconds.observe(span.seconds)
+            self.recent_spans.append(span)
+        logging.debug(f"⏱ Row {span.row} {outcome} in {span.seconds:.2f}s "
+                      f"({', '.join(f'{k} {v:.2f}s' for k, v in span.stages.items())})")
+
+    @contextmanager
+    def stage(self, name, spans=None):
+        # Times one stage; by default the time is also added to the row this thread is working on
+        if spans is None:
+            spans = [self.current_span]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stage_seconds[name].observe(elapsed)
+                for span in spans:
+                    if span is not None:
+                        span.stages[name] = span.stages.get(name, 0) + elapsed
+
+    def record_http(self, api, status, sent=0, received=0):
+        with self._lock:
+            self.http_requests[(api, str(status))] += 1
+            self.http_bytes[(api, 'sent')] += sent
+            self.http_bytes[(api, 'received')] += received
+
+    def record_retry(self, api, count=1):
+        with self._lock:
+            self.http_retries[api] += count
+
+    def stage_summary(self):
+        with self._lock:
+            return {name: {'count': h.count, 'mean_ms': round(h.sum / h.count * 1000, 1) if h.count else 0.0}
+                    for name, h in sorted(self.stage_seconds.items())}
+
+    def spans(self, limit=50):
+        with self._lock:
+            return [span.to_dict() for span in list(self.recent_spans)[-limit:]][::-1]
+
+    def render(self):
+        from utils.rate_limit import limiter
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, hist, labels=''):
+            sep, braces = (',', f'{{{labels}}}') if labels else ('', '')
+            for bound, count in hist.cumulative():
+                lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist.count}')
+            lines.append(f"{name}_sum{braces} {hist.sum:.6f}")
+            lines.append(f"{name}_count{braces} {hist.count}")
+
+        with self._lock:
+            family('uploader_stage_seconds', 'histogram', 'Time spent per pipeline stage.')
+            for stage, hist in sorted(self.stage_seconds.items()):
+                histogram('uploader_stage_seconds', hist, f'stage="{stage}"')
+            family('uploader_row_seconds', 'histogram', 'Time from picking up a row to finishing it.')
+            histogram('uploader_row_seconds', self.row_seconds)
+            family('uploader_rows_total', 'counter', 'Rows processed, by outcome.')
+            for outcome, count in sorted(self.rows.items()):
+                lines.append(f'uploader_rows_total{{outcome="{outcome}"}} {count}')
+            family('uploader_http_requests_total', 'counter', 'HTTP round trips, by API and status.')
+            for (api, status), count in sorted(self.http_requests.items()):
+                lines.append(f'uploader_http_requests_total{{api="{api}",status="{status}"}} {count}')
+            family('uploader_http_retries_total', 'counter', 'Requests retried after a throttle, 5xx or connection error.')
+            for api, count in sorted(self.http_retries.items()):
+                lines.append(f'uploader_http_retries_total{{api="{api}"}} {count}')
+            family('uploader_http_bytes_total', 'counter', 'HTTP body bytes, by API and direction.')
+            for (api, direction), count in sorted(self.http_bytes.items()):
+                lines.append(f'uploader_http_bytes_total{{api="{api}",direction="{direction}"}} {count}')
+
+        buckets = limiter.stats()
+        family('uploader_rate_limit_rate', 'gauge', 'Current allowed requests per second per rate-limit bucket.')
+        for name, stats in buckets.items():
+            lines.append(f'uploader_rate_limit_rate{{bucket="{name}"}} {stats["rate"]}')
+        family('uploader_rate_limit_throttles_total', 'counter', 'Throttling answers seen per rate-limit bucket.')
+        for name, stats in buckets.items():
+            lines.append(f'uploader_rate_limit_throttles_total{{bucket="{name}"}} {stats["throttles"]}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
@@ -1,115 +1,540 @@
-import logging, re, requests, random, os
+import logging, re, os, sys, threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from io import BytesIO
 from app import app
-from utils.google_api import GoogleAPI
-from utils.wordpress_api import WordPressAPI
+from utils.clients import clients
+from utils.doc_cache import DocCache
+from utils.wordpress_api import BATCH_MAX_REQUESTS
+from utils.run_log import run_log
+from utils.media import fetch_image, ensure_extension, ImageDownloadError
+from utils.image_optimizer import image_optimizer
+from utils.media_index import MediaIndex
+from utils.metrics import metrics
+from utils.profiling import RunProfiler
+from utils.scheduler import scheduler_for
+from utils.sync_state import SyncState, row_fingerprint
+from utils.targets import Target, conflicting_target
 
-LOG_PATH = "logs/runtime.log"
-MAX_LOG_LINES = 500
+PROCESS_MODES = ('sequential', 'concurrent')
+DRIVE_DOWNLOAD_URL = 'https://drive.google.com/uc?export=download&id={}'
 
-def convert_drive_link_to_direct(link):
+def extract_drive_file_id(link):
     m = re.search(r'/file/d/([a-zA-Z0-9_-]+)', link) or re.search(r'id=([a-zA-Z0-9_-]+)', link)
-    return f'https://drive.google.com/uc?export=download&id={m.group(1)}' if m else link
+    return m.group(1) if m else None
+
+def convert_drive_link_to_direct(link):
+    file_id = extract_drive_file_id(link)
+    return DRIVE_DOWNLOAD_URL.format(file_id) if file_id else link
+
+def row_data(row, col_map):
+    return {h: row[j] if j < len(row) else '' for h, j in col_map.items()}
+
+def row_title(data):
+    return next((data[k] for k in ['Title', 'כותרת מאמר', 'נושא'] if data.get(k)), None)
+
+def row_doc_id(data):
+    doc = next((data[k] for k in ['קישור למאמר', 'Document Link'] if data.get(k)), '')
+    match = re.search(r'/document/d/([a-zA-Z0-9-_]+)', doc)
+    return match.group(1) if match else None
 
 def ensure_logs_dir():
     os.makedirs("logs", exist_ok=True)
 
 def log_to_file(time, action, status, details):
-    ensure_logs_dir()
-    line = f"{time} | {action} | {status} | {details}\n"
-    if os.path.exists(LOG_PATH):
-        with open(LOG_PATH, "r", encoding="utf-8") as f:
-            lines = f.readlines()[-MAX_LOG_LINES+1:]
-    else:
-        lines = []
-    lines.append(line)
-    with open(LOG_PATH, "w", encoding="utf-8") as f:
-        f.writelines(lines)
+    run_log.log_event(time, action, status, details)
+
+def wordpress_client(target=None):
+    target = target or Target.default(app.config)
+    return clients.wordpress(target.wp_api_url, target.wp_user, target.wp_key,
+                             pool_size=target.wp_workers + 2, max_retries=app.config['WP_MAX_RETRIES'],
+                             timeout=app.config['WP_TIMEOUT'])
 
 class ArticleProcessor:
-    def __init__(self):
+    def __init__(self, mode='sequential', tracker=None, force=False, profile=False, target=None):
         ensure_logs_dir()
-        self.google = GoogleAPI()
-        self.wp = WordPressAPI(app.config['WP_API_URL'], app.config['WP_API_USER'], app.config['WP_API_KEY'])
-        self.sheet = app.config['GOOGLE_SHEETS_ID']
-        self.tab = app.config.get('GOOGLE_SHEET_NAME') or 'Sheet1'
+        self.target = target or Target.default(app.config)
+        doc_cache = DocCache(app.config['DOC_CACHE_DIR'], app.config['DOC_CACHE_MAX_BYTES'],
+                             variant=self.target.wp_api_url) if app.config['DOC_CACHE_ENABLED'] else None
+        self.google = clients.google_api(write_batch_size=app.config['SHEETS_WRITE_BATCH_SIZE'],
+                                         write_flush_seconds=app.config['SHEETS_WRITE_FLUSH_SECONDS'],
+                                         doc_cache=doc_cache, meta_ttl=app.config['SHEETS_META_TTL'])
+        self.wp = wordpress_client(self.target)
+        self.scheduler = scheduler_for(self.wp)
+        self.sheet = self.target.spreadsheet_id
+        self.tab = self.target.tab or 'Sheet1'
+        self.mode = mode if mode in PROCESS_MODES else 'sequential'
+        self.google_slots = self.target.google_slots
+        self.wp_slots = self.target.wp_slots
+        self.media_index = MediaIndex(self.wp, app.config['MEDIA_INDEX_VERIFY_SECONDS'])
+        self.google.image_url = self._host_doc_image
+        self._doc_images = {}
+        self._doc_images_lock = threading.Lock()
+        self.tracker = tracker
+        self.force = force
+        self.sync_state = SyncState(self.sheet, self.tab)
+        self._row_state = {}
+        self._prefetched = {}
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.image_bytes = 0
+        self.image_count = 0
+        self.optimizer = image_optimizer(app.config) if app.config['IMAGE_OPTIMIZE'] else None
+        self.optimized_count = 0
+        self.optimized_saved_bytes = 0
+        self.batch_posts = app.config['WP_BATCH_POSTS'] and self.wp.supports_batch()
+        self._post_queue = []
+        self._post_lock = threading.Lock()
         self.errors = False
+        self.profiler = RunProfiler(app.config['PROFILE_DIR']) if profile else None
 
     def run_processor(self, row_filter=None):
+        if not self.profiler:
+            return self._run(row_filter)
         try:
-            meta = self.google.sheets_service.spreadsheets().get(spreadsheetId=self.sheet).execute()
+            return self.profiler.call(self._run, row_filter)
+        finally:
+            self.profiler.dump()
+
+    def _run(self, row_filter=None):
+        try:
+            sheet_title = self.google.get_sheet_properties(self.sheet, self.target.tab)['title']
         except Exception as e:
             log_to_file(datetime.now().isoformat(), "System", "Exception", f"Sheet metadata fetch failed: {str(e)}")
             return
+        other = conflicting_target(app.config, self.target, sheet_title)
+        if other:
+            # Its rows' post IDs belong to the other site; updating them here would overwrite unrelated posts
+            log_to_file(datetime.now().isoformat(), "System", "Error",
+                        f"Tab {sheet_title} is published to {other.wp_api_url} by fan-out target {other.name}")
+            return
 
-        rows = self.google.get_sheet_data(self.sheet, f"{meta['sheets'][0]['properties']['title']}!A1:H")
-        if not rows: return
-        headers = rows[0]
+        start, end = row_filter or (2, None)
+        try:
+            with metrics.stage('sheet_read', spans=()):
+                headers, targets = self.google.get_rows(self.sheet, sheet_title, start, end)
+        except Exception as e:
+            log_to_file(datetime.now().isoformat(), "System", "Exception", f"Sheet data fetch failed: {str(e)}")
+            return
+        if not headers: return
         col_map = {k.strip(): i for i, k in enumerate(headers)}
 
-        for i, row in enumerate(rows[1:], start=2):
-            if row_filter and not (row_filter[0] <= i <= row_filter[1]): continue
-            try:
-                data = {h: row[j] if j < len(row) else '' for h, j in col_map.items()}
-                title = next((data[k] for k in ['Title', 'כותרת מאמר', 'נושא'] if data.get(k)), None)
-                if not title:
-                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Skipped", "Missing title")
-                    continue
+        if self.tracker:
+            self.tracker.start(len(targets))
+        targets = self._select_changed(targets, col_map)
 
-                doc = next((data[k] for k in ['קישור למאמר', 'Document Link'] if data.get(k)), '')
-                content = ''
-                try:
-                    match = re.search(r'/document/d/([a-zA-Z0-9-_]+)', doc)
-                    if match:
-                        content = self.google.get_doc_content(match.group(1))
-                    else:
-                        log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", "Invalid Doc URL")
-                        continue
-                except Exception as e:
-                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Doc fetch failed: {str(e)}")
-                    continue
+        pool = None
+        if self.mode == 'concurrent':
+            workers = self.target.google_workers + self.target.wp_workers
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='row')
+        try:
+            # Docs are prefetched one window at a time so memory stays bounded on long ranges
+            window = app.config['DOCS_PREFETCH_SIZE']
+            for start in range(0, len(targets), window):
+                if self._cancelled():
+                    break
+                chunk = targets[start:start + window]
+                self._prefetch_docs(chunk, col_map)
+                if pool:
+                    futures = [pool.submit(self._process_row_in_context, i, row, col_map) for i, row in chunk]
+                    for future in futures:
+                        future.result()
+                else:
+                    for i, row in chunk:
+                        if self._cancelled():
+                            break
+                        self._run_row(i, row, col_map)
+        finally:
+            if pool:
+                pool.shutdown()
+            self._prefetched = {}
+
+        self._flush_post_queue()
+        for media_id in self.wp.flush_media_meta():
+            log_to_file(datetime.now().isoformat(), "System", "Error", f"Media {media_id} metadata update failed")
+        self._flush_sheet_updates()
+        if self.image_count:
+            log_to_file(datetime.now().isoformat(), "System", "Info",
+                        f"Transferred {self.image_count} images ({self.image_bytes} bytes)")
+        if self.optimized_count:
+            log_to_file(datetime.now().isoformat(), "System", "Info",
+                        f"Optimized {self.optimized_count} images, saved {self.optimized_saved_bytes} bytes of upload")
+        run_log.flush()
 
-                date_str = data.get('תאריך פרסום') or ''
-                for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y']:
-                    try:
-                        date = datetime.strptime(date_str, fmt)
-                        date = date.replace(hour=random.randint(8, 17), minute=random.randint(0, 59))
-                        break
-                    except: date = None
-
-                img = data.get('קישור לתמונה')
-                name = data.get('שם תמונה') or 'default.jpg'
-                media_id = None
-                if img:
-                    try:
-                        r = requests.get(convert_drive_link_to_direct(img), timeout=10)
-                        if r.status_code == 200:
-                            media_id = self.wp.upload_media(BytesIO(r.content).read(), name, title=title)
-                        else:
-                            log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", "Image download failed")
-                    except Exception as e:
-                        log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Image fetch error: {str(e)}")
-
-                post = self.wp.create_post(title=title, content=content, category_id=None, featured_media_id=media_id, date=date)
-                if not post:
-                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", "Post creation failed")
+    def _select_changed(self, targets, col_map):
+        # Works out which rows need publishing (new) or updating (changed since the last run)
+        # and skips the rest without touching Docs or WordPress
+        records = self.sync_state.load([i for i, _ in targets])
+        doc_ids = {i: row_doc_id(row_data(row, col_map)) for i, row in targets}
+        with metrics.stage('doc_revisions', spans=()):
+            revisions = self.google.get_doc_revisions([d for d in doc_ids.values() if d]) if doc_ids else {}
+        # Records are keyed by row number, which shifts when rows are inserted or deleted above; a row whose
+        # record belongs to another doc is matched to its post by doc ID instead
+        moved = self.sync_state.find_by_docs({d for i, d in doc_ids.items() if d and not (
+            records.get(i) and records[i].wordpress_id and records[i].doc_id == d)})
+
+        # Record writes wait until every row has been matched, since moving one record overwrites another
+        selected, unchanged, writes = [], 0, []
+        for i, row in targets:
+            data = row_data(row, col_map)
+            doc_id = doc_ids[i]
+            state = {'doc_id': doc_id, 'doc_revision': revisions.get(doc_id), 'fingerprint': row_fingerprint(data)}
+            record = records.get(i)
+            if not (record and record.wordpress_id and record.doc_id == doc_id):
+                record = moved.get(doc_id) if doc_id else None
+            if record:
+                state['post_id'] = record.wordpress_id
+                state['scheduled_date'] = record.scheduled_date
+                if (not self.force and record.fingerprint == state['fingerprint'] and
+                        state['doc_revision'] and record.doc_revision == state['doc_revision']):
+                    if record.sheet_row != i:
+                        writes.append((self.sync_state.relocate, (i, self.sync_state.snapshot(record))))
+                    self._repair_sheet(i, data, col_map, record.post_url)
+                    unchanged += 1
+                    self._track(i, 'skipped')
+                    continue
+            else:
+                post = self._already_published(data)
+                if post and not self.force:
+                    writes.append((self.sync_state.record, (i, row_title(data), doc_id, state['doc_revision'],
+                                                            state['fingerprint'], post)))
+                    unchanged += 1
+                    self._track(i, 'skipped')
                     continue
+                if post:
+                    # Forced rows are reprocessed as updates of the post they already have
+                    state['post_id'] = post.get('id')
+            self._row_state[i] = state
+            selected.append((i, row))
+
+        for write, args in writes:
+            try:
+                write(*args)
+            except Exception as e:
+                log_to_file(datetime.now().isoformat(), f"Row {args[0]}", "Error", f"Sync state update failed: {str(e)}")
+        if unchanged:
+            log_to_file(datetime.now().isoformat(), "System", "Info", f"Skipped {unchanged} unchanged rows")
+        return selected
+
+    def _already_published(self, data):
+        # Rows published before sync state existed: returns the existing post to adopt instead of creating a duplicate
+        title = row_title(data)
+        if not title or data.get('סטטוס') != 'מוכן' or not data.get('POST URL'):
+            return None
+        post = self.wp.find_post_by_slug(self.wp._generate_slug(title))
+        if not post:
+            return None
+        post['link'] = data['POST URL']
+        return post
+
+    def _repair_sheet(self, i, data, col_map, url):
+        # An unchanged row whose write-back was lost (or that moved) gets its status and URL queued again
+        try:
+            failures = []
+            if 'סטטוס' in col_map and data.get('סטטוס') != 'מוכן':
+                failures += self.google.queue_cell_update(self.sheet, self.tab, i, col_map['סטטוס'], 'מוכן')
+            if url and 'POST URL' in col_map and data.get('POST URL') != url:
+                failures += self.google.queue_cell_update(self.sheet, self.tab, i, col_map['POST URL'], url)
+            self._flush_sheet_updates(failures)
+        except Exception as e:
+            log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Sheet update failed: {str(e)}")
+
+    def _prefetch_docs(self, chunk, col_map):
+        doc_ids = [d for d in (row_doc_id(row_data(row, col_map)) for _, row in chunk) if d]
+        revisions = {s['doc_id']: s['doc_revision'] for s in self._row_state.values() if s.get('doc_revision')}
+        self._prefetched = {}
+        if not doc_ids:
+            return
+        try:
+            with self.google_slots, metrics.stage('doc_prefetch', spans=()):
+                html, errors = self.google.get_docs_content(doc_ids, revisions)
+            self._prefetched.update(html)
+            self._prefetched.update(errors)
+        except Exception as e:
+            # Rows fall back to fetching their own doc
+            log_to_file(datetime.now().isoformat(), "System", "Error", f"Doc prefetch failed: {str(e)}")
+
+    def _count_bytes(self, size):
+        with self._stats_lock:
+            self.image_count += 1
+            self.image_bytes += size
+
+    def _optimize_image(self, i, image):
+        # Returns the image to upload: a smaller re-encoded copy, or the original if that isn't smaller
+        try:
+            with metrics.stage('image_optimize'):
+                optimized = self.optimizer.optimize(image)
+        except Exception as e:
+            log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Image optimization failed, uploading original: {str(e)}")
+            return image
+        if not optimized:
+            return image
+        with self._stats_lock:
+            self.optimized_count += 1
+            self.optimized_saved_bytes += image.size - optimized.size
+        return optimized
+
+    def _flush_sheet_updates(self, failures=None):
+        if failures is None:
+            with self.google_slots, metrics.stage('sheet_write', spans=()):
+                failures = self.google.flush_updates(final=True)
+        for failure in failures:
+            log_to_file(datetime.now().isoformat(), f"Row {failure['row']}", "Error",
+                        f"Sheet update failed for {failure['range']}: {failure['error']}")
+
+    def _process_row_in_context(self, i, row, col_map):
+        with app.app_context():
+            if self._cancelled():
+                return
+            if self.profiler:
+                self.profiler.call(self._run_row, i, row, col_map)
+            else:
+                self._run_row(i, row, col_map)
+
+    def _run_row(self, i, row, col_map):
+        # A row that ends up waiting in the post batch keeps its span on the queued item
+        span = metrics.start_row(i)
+        outcome = self._process_row(i, row, col_map)
+        metrics.finish_row(span, outcome)
+        self._track(i, outcome)
 
-                url = post.get('link')
+    def _cancelled(self):
+        if self._stop.is_set():
+            return True
+        if self.tracker and self.tracker.cancelled():
+            self._stop.set()
+            log_to_file(datetime.now().isoformat(), "System", "Cancelled", "Run cancelled, remaining rows skipped")
+            return True
+        return False
+
+    def _track(self, i, outcome):
+        # None means the row is waiting in the post batch and gets tracked when the batch is sent
+        if self.tracker and outcome:
+            self.tracker.row_done(i, outcome)
+
+    def _resolve_media(self, i, img, name, title):
+        drive_id = extract_drive_file_id(img)
+        with self.media_index.lock_for(drive_id or img):
+            image = upload = None
+            try:
+                media_id = self.media_index.find(drive_file_id=drive_id)
+                if media_id:
+                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Info", f"Reusing media {media_id} for {drive_id}")
+                    return media_id
+
+                with self.google_slots, metrics.stage('image_download'):
+                    image = fetch_image(convert_drive_link_to_direct(img), app.config['IMAGE_SPOOL_BYTES'])
+                self._count_bytes(image.size)
+                media_id = self.media_index.find(content_hash=image.sha256)
+                if media_id:
+                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Info", f"Reusing media {media_id} (identical image)")
+                else:
+                    upload = self._optimize_image(i, image) if self.optimizer else image
+                    with self.wp_slots, metrics.stage('media_upload'):
+                        media_id = self.wp.upload_media(upload.file, ensure_extension(name, upload.content_type),
+                                                        title=title, content_type=upload.content_type)
+                if media_id:
+                    self.media_index.record(media_id, drive_file_id=drive_id, content_hash=image.sha256)
+                return media_id
+            except ImageDownloadError as e:
+                log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", str(e))
+            except Exception as e:
+                log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Image fetch error: {str(e)}")
+            finally:
+                if upload and upload is not image:
+                    upload.close()
+                if image:
+                    image.close()
+            return None
+
+    def _host_doc_image(self, object_id, content_uri):
+        # Images uploaded into a Doc only have an expiring contentUri; they are uploaded to the site (once per
+        # identical image) and the post links there. A failure fails the doc, so the row is retried next run.
+        with self._doc_images_lock:
+            if content_uri in self._doc_images:
+                return self._doc_images[content_uri]
+        with metrics.stage('image_download'):
+            image = fetch_image(content_uri, app.config['IMAGE_SPOOL_BYTES'])
+        try:
+            self._count_bytes(image.size)
+            with self.media_index.lock_for(image.sha256):
+                media_id = self.media_index.find(content_hash=image.sha256)
+                if not media_id:
+                    with self.wp_slots, metrics.stage('media_upload'):
+                        media_id = self.wp.upload_media(image.file, ensure_extension(f"doc-image-{image.sha256[:12]}",
+                                                        image.content_type), content_type=image.content_type)
+                    if not media_id:
+                        raise RuntimeError(f"Upload of Doc image {object_id} failed")
+                    self.media_index.record(media_id, content_hash=image.sha256)
+            with self._doc_images_lock:
+                url = self._doc_images.get(media_id)
+            if not url:
+                url = self.wp.media_url(media_id)
+                if not url:
+                    raise RuntimeError(f"Media {media_id} has no URL")
+            with self._doc_images_lock:
+                self._doc_images[content_uri] = self._doc_images[media_id] = url
+            return url
+        finally:
+            image.close()
+
+    def _process_row(self, i, row, col_map):
+        reserved = False
+        try:
+            data = row_data(row, col_map)
+            title = row_title(data)
+            if not title:
+                log_to_file(datetime.now().isoformat(), f"Row {i}", "Skipped", "Missing title")
+                return 'skipped'
+
+            state = self._row_state.get(i, {})
+            doc_id = row_doc_id(data)
+            content = ''
+            try:
+                if doc_id:
+                    content = self._prefetched.get(doc_id)
+                    if isinstance(content, Exception):
+                        raise content
+                    if content is None:
+                        with self.google_slots, metrics.stage('doc_fetch'):
+                            content = self.google.get_doc_content(doc_id, state.get('doc_revision'))
+                else:
+                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", "Invalid Doc URL")
+                    return 'error'
+            except Exception as e:
+                log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Doc fetch failed: {str(e)}")
+                return 'error'
+
+            date_str = data.get('תאריך פרסום') or ''
+            for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y']:
                 try:
+                    date = datetime.strptime(date_str, fmt).date()
+                    break
+                except: date = None
+
+            status = None
+            if date:
+                # The scheduler picks the time of day; an existing post keeps the slot it already has
+                day = date
+                with metrics.stage('schedule'):
+                    date, status = self.scheduler.reserve(self.sheet, self.tab, i, title, day, state.get('scheduled_date'))
+                reserved = True
+                if date.date() != day:
+                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Info", f"{day} is fully booked, scheduled for {date}")
+
+            img = data.get('קישור לתמונה')
+            name = data.get('שם תמונה') or 'default.jpg'
+            media_id = None
+            if img:
+                media_id = self._resolve_media(i, img, name, title)
+
+            item = {'row': i, 'col_map': col_map, 'title': title, 'content': content,
+                    'category_id': None, 'featured_media_id': media_id, 'date': date, 'status': status,
+                    'post_id': state.get('post_id'), 'span': metrics.current_span}
+            if self.batch_posts:
+                self._queue_post(item)
+                return None
+
+            with self.wp_slots, metrics.stage('post_save'):
+                if item['post_id']:
+                    post = self.wp.update_post(item['post_id'], title=title, content=content, category_id=None,
+                                               featured_media_id=media_id, date=date, status=status)
+                else:
+                    post = self.wp.create_post(title=title, content=content, category_id=None, featured_media_id=media_id,
+                                               date=date, status=status)
+            return self._finish_row(item, post)
+
+        except Exception as e:
+            log_to_file(datetime.now().isoformat(), f"Row {i}", "Exception", str(e))
+            if reserved:
+                self._release_slot(i)
+            return 'error'
+
+    def _release_slot(self, i):
+        try:
+            self.scheduler.release(self.sheet, self.tab, i)
+        except Exception as e:
+            log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Schedule update failed: {str(e)}")
+
+    def _queue_post(self, item):
+        with self._post_lock:
+            self._post_queue.append(item)
+            if len(self._post_queue) < BATCH_MAX_REQUESTS:
+                return
+            batch, self._post_queue = self._post_queue, []
+        self._publish_batch(batch)
+
+    def _flush_post_queue(self):
+        with self._post_lock:
+            batch, self._post_queue = self._post_queue, []
+        if batch:
+            self._publish_batch(batch)
+
+    def _publish_batch(self, batch):
+        if self._cancelled():
+            # Also covers a fan-out shard whose lease was taken over: its new owner saves these rows
+            log_to_file(datetime.now().isoformat(), "System", "Cancelled", f"{len(batch)} queued posts not saved")
+            for item in batch:
+                if item['date']:
+                    self._release_slot(item['row'])
+            return
+        try:
+            with self.wp_slots, metrics.stage('post_save', spans=[item['span'] for item in batch]):
+                posts = self.wp.save_posts(batch)
+        except Exception as e:
+            log_to_file(datetime.now().isoformat(), "System", "Exception", f"Batch post creation failed: {str(e)}")
+            posts = [None] * len(batch)
+        for item, post in zip(batch, posts):
+            outcome = self._finish_row(item, post)
+            metrics.finish_row(item['span'], outcome)
+            self._track(item['row'], outcome)
+
+    def _finish_row(self, item, post):
+        i, col_map = item['row'], item['col_map']
+        try:
+            if not post:
+                log_to_file(datetime.now().isoformat(), f"Row {i}", "Error",
+                            "Post update failed" if item.get('post_id') else "Post creation failed")
+                if item['date']:
+                    self._release_slot(i)
+                return 'error'
+
+            url = post.get('link')
+            try:
+                failures = []
+                with self.google_slots, metrics.stage('sheet_write', spans=[item.get('span')]):
                     if 'סטטוס' in col_map:
-                        self.google.update_cell(self.sheet, self.tab, f"{chr(65+col_map['סטטוס'])}{i}", 'מוכן')
+                        failures += self.google.queue_cell_update(self.sheet, self.tab, i, col_map['סטטוס'], 'מוכן')
                     if 'POST URL' in col_map:
-                        self.google.update_cell(self.sheet, self.tab, f"{chr(65+col_map['POST URL'])}{i}", url)
+                        failures += self.google.queue_cell_update(self.sheet, self.tab, i, col_map['POST URL'], url)
+                self._flush_sheet_updates(failures)
+            except Exception as e:
+                log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Sheet update failed: {str(e)}")
+
+            state = self._row_state.get(i)
+            if state:
+                try:
+                    self.sync_state.record(i, item['title'], state['doc_id'], state['doc_revision'], state['fingerprint'],
+                                           post, item['featured_media_id'], item['date'])
                 except Exception as e:
-                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Sheet update failed: {str(e)}")
+                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Sync state update failed: {str(e)}")
 
-                log_to_file(datetime.now().isoformat(), f"Row {i}", "Success", f"Published to {url}")
+            if item['date']:
+                try:
+                    self.scheduler.attach(self.sheet, self.tab, i, post)
+                except Exception as e:
+                    log_to_file(datetime.now().isoformat(), f"Row {i}", "Error", f"Schedule update failed: {str(e)}")
 
-            except Exception as e:
-                log_to_file(datetime.now().isoformat(), f"Row {i}", "Exception", str(e))
+            verb = "Updated" if item.get('post_id') else "Published to"
+            log_to_file(datetime.now().isoformat(), f"Row {i}", "Success", f"{verb} {url}")
+            return 'success'
+
+        except Exception as e:
+            log_to_file(datetime.now().isoformat(), f"Row {i}", "Exception", str(e))
+            return 'error'
 
-def run_article_processor(row_filter=None): ArticleProcessor().run_processor(row_filter)
-def run_specific_rows(start, end): ArticleProcessor().run_processor((start, end))
-if __name__ == "__main__": run_article_processor()
+def run_article_processor(row_filter=None, mode='sequential', force=False, profile=False): ArticleProcessor(mode, force=force, profile=profile).run_processor(row_filter)
+def run_specific_rows(start, end, mode='sequential', force=False, profile=False): ArticleProcessor(mode, force=force, profile=profile).run_processor((start, end))
+if __name__ == "__main__":
+    # Run outside Flask, so models and DB-backed indexes need an app context of their own
+    with app.app_context():
+        run_article_processor(profile='--profile' in sys.argv)
@@ -0,0 +1,86 @@
+import cProfile, logging, os, pstats, sys, threading
+from datetime import datetime
+
+REPORT_LINES = 60
+# From 3.12 cProfile runs on sys.monitoring: one profile per interpreter, and it sees every thread
+SHARED_PROFILE = sys.version_info >= (3, 12)
+
+class RunProfiler:
+    # Before 3.12 cProfile only sees the thread that enabled it, so each row thread gets its own profile
+    # and they are merged into one report when the run ends. From 3.12 the outermost call enables one
+    # shared profile and nested or concurrent calls run inside it.
+    def __init__(self, directory, label='run'):
+        self.directory = directory
+        self.label = label
+        self._local = threading.local()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._shared_calls = 0
+        self._shared = None
+
+    def _profile(self):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def _enable(self, profile):
+        # Another profiler (a debugger, coverage, an outer cProfile) may hold the hook; never fail the run for it
+        try:
+            profile.enable()
+            return True
+        except ValueError as e:
+            logging.warning(f"⚠️ Profiling skipped: {str(e)}")
+            return False
+
+    def call(self, fn, *args, **kwargs):
+        if SHARED_PROFILE:
+            return self._call_shared(fn, *args, **kwargs)
+        profile = self._profile()
+        if getattr(self._local, 'active', False) or not self._enable(profile):
+            return fn(*args, **kwargs)
+        self._local.active = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._local.active = False
+
+    def _call_shared(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._shared_calls == 0:
+                profile = cProfile.Profile()
+                if self._enable(profile):
+                    self._shared = profile
+                    self._profiles.append(profile)
+            self._shared_calls += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._shared_calls -= 1
+                if self._shared_calls == 0 and self._shared:
+                    self._shared.disable()
+                    self._shared = None
+
+    def dump(self):
+        # Writes <label>-<timestamp>.prof (for snakeviz / pstats) and a .txt summary; returns the .txt path
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{self.label}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(f"{base}.prof")
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            stats.stream = f
+            f.write("All threads profiled together\n\n" if SHARED_PROFILE else f"{len(profiles)} thread(s) profiled\n\n")
+            stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+            stats.sort_stats('tottime').print_stats(REPORT_LINES)
+        logging.info(f"🔬 Profile written to {base}.txt and {base}.prof")
+        return f"{base}.txt"
@@ -0,0 +1,166 @@
+import logging, threading, time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Requests per second and burst size per API, per process. Sheets allows 60 read and 60 write requests
+# per minute per user and Docs 300 reads per minute; Drive and WordPress are set well below their limits.
+DEFAULT_LIMITS = {
+    'sheets_read': (1.0, 5),
+    'sheets_write': (1.0, 5),
+    'docs': (5.0, 10),
+    'drive': (20.0, 40),
+    'wordpress': (5.0, 10),
+}
+THROTTLE_STATUSES = (429, 503)
+# Multiplicative decrease on a throttle; the rate then climbs back linearly over about RECOVERY_SECONDS
+DECREASE_FACTOR = 0.5
+RECOVERY_SECONDS = 30
+MAX_RETRY_AFTER = 120
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0), MAX_RETRY_AFTER)
+
+class AdaptiveBucket:
+    # Token bucket with an AIMD refill rate: each throttle halves the rate (at most once per second, since
+    # concurrent requests all see the same overload) and every success adds back a little, so the rate
+    # settles just under whatever the server tolerates.
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.enabled = True
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._last_cut = 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttles = 0
+        self.cuts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def min_rate(self):
+        return self.max_rate / 50
+
+    def configure(self, rate, burst=None):
+        with self._lock:
+            self.max_rate = rate
+            self.rate = min(self.rate, rate) if self.cuts else rate
+            if burst:
+                self.burst = burst
+            self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now):
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self.tokens = min(self.burst, self.tokens + (now - start) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        # Takes the tokens straight away, going into debt if needed, then sleeps off the debt outside the
+        # lock; callers queue up in arrival order and a batch may ask for more than the burst size
+        if not self.enabled:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= tokens
+            self.requests += tokens
+            delay = max(0, self._paused_until - now) + max(0, -self.tokens) / self.rate
+            if delay > 0:
+                self.waits += 1
+                self.wait_seconds += delay
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def success(self, count=1):
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            for _ in range(count):
+                self.rate = min(self.max_rate, self.rate + self.max_rate / RECOVERY_SECONDS / self.rate)
+
+    def throttle(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttles += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if now - self._last_cut >= 1.0:
+                self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+                self._last_cut = now
+                self.cuts += 1
+                logging.warning(f"🐢 {self.name} throttled, rate cut to {self.rate:.2f}/s"
+                                + (f", paused {retry_after:.1f}s" if retry_after else ""))
+            self.tokens = min(self.tokens, 0)
+
+    def stats(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate': round(self.rate, 3),
+                'max_rate': self.max_rate,
+                'burst': self.burst,
+                'tokens': round(self.tokens, 2),
+                'paused_for': round(max(0, self._paused_until - time.monotonic()), 1),
+                'requests': self.requests,
+                'throttles': self.throttles,
+                'rate_cuts': self.cuts,
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 2),
+                'enabled': self.enabled,
+            }
+
+class RateLimiter:
+    # Process-wide buckets, one per API (and per site for WordPress), shared by every client instance
+    def __init__(self, limits=DEFAULT_LIMITS):
+        self.limits = dict(limits)
+        self.enabled = True
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, api, key=None):
+        name = f"{api}:{key}" if key else api
+        with self._lock:
+            bucket = self._buckets.get(name)
+            if bucket is None:
+                rate, burst = self.limits[api]
+                bucket = self._buckets[name] = AdaptiveBucket(name, rate, burst)
+                bucket.enabled = self.enabled
+        return bucket
+
+    def configure(self, rates, enabled=True):
+        # rates: {api: requests per second}; applied to existing buckets too
+        with self._lock:
+            self.enabled = enabled
+            for api, rate in rates.items():
+                if rate:
+                    self.limits[api] = (rate, max(self.limits.get(api, (rate, 1))[1], 1))
+            buckets = list(self._buckets.values())
+        for bucket in buckets:
+            api = bucket.name.split(':', 1)[0]
+            bucket.enabled = enabled
+            if rates.get(api):
+                bucket.configure(rates[api])
+
+    def stats(self):
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {name: bucket.stats() for name, bucket in sorted(buckets.items())}
+
+limiter = RateLimiter()
@@ -0,0 +1,249 @@
+import atexit, fcntl, json, logging, os, queue, re, threading
+from utils.events import events
+
+LOG_DIR = "logs"
+SEGMENT_PREFIX = "runtime."
+SEGMENT_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx.json"
+SEGMENT_MAX_BYTES = 5 * 1024 * 1024
+MAX_SEGMENTS = 20
+READ_BLOCK_SIZE = 64 * 1024
+
+_segment_re = re.compile(rf"^{re.escape(SEGMENT_PREFIX)}(\d+){re.escape(SEGMENT_SUFFIX)}$")
+_row_re = re.compile(r'^Row (\d+)$')
+
+def _segment_path(seq):
+    return os.path.join(LOG_DIR, f"{SEGMENT_PREFIX}{seq:06d}{SEGMENT_SUFFIX}")
+
+def _index_path(path):
+    return path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+def list_segments():
+    # Oldest first; segments are never renamed, so a reader can't lose its place mid-scan
+    if not os.path.isdir(LOG_DIR):
+        return []
+    seqs = sorted(int(m.group(1)) for m in map(_segment_re.match, os.listdir(LOG_DIR)) if m)
+    return [(seq, _segment_path(seq)) for seq in seqs]
+
+def _reverse_lines(path):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b''
+        while pos > 0:
+            size = min(READ_BLOCK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            buf = f.read(size) + buf
+            lines = buf.split(b'\n')
+            buf = lines[0]
+            for line in reversed(lines[1:]):
+                if line.strip():
+                    yield line
+        if buf.strip():
+            yield buf
+
+def _first_time(path):
+    with open(path, 'rb') as f:
+        line = f.readline()
+    try:
+        return json.loads(line).get('time')
+    except ValueError:
+        return None
+
+class SegmentIndex:
+    # Byte offsets of a segment's lines by row and by lowercased status. Segments only grow, so the index
+    # picks up where it stopped; once a segment has rotated out its index is saved next to it.
+    def __init__(self, size=0, rows=None, statuses=None):
+        self.size = size
+        self.rows = rows or {}
+        self.statuses = statuses or {}
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(_index_path(path), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(data['size'], {int(k): v for k, v in data['rows'].items()}, data['statuses'])
+
+    def save(self, path):
+        tmp = f"{_index_path(path)}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'size': self.size, 'rows': self.rows, 'statuses': self.statuses}, f)
+        os.replace(tmp, _index_path(path))
+
+    def update(self, path):
+        with open(path, 'rb') as f:
+            f.seek(self.size)
+            data = f.read()
+        # A batch still being written has no newline yet; it's indexed next time
+        end = data.rfind(b'\n') + 1
+        offset = self.size
+        for line in data[:end].split(b'\n')[:-1]:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+            if isinstance(event, dict):
+                if event.get('row') is not None:
+                    self.rows.setdefault(event['row'], []).append(offset)
+                status = (event.get('status') or '').lower()
+                if status:
+                    self.statuses.setdefault(status, []).append(offset)
+            offset += len(line) + 1
+        self.size = offset
+
+    def offsets(self, row=None, status=None):
+        found = None
+        if row is not None:
+            found = self.rows.get(row, [])
+        if status:
+            by_status = self.statuses.get(status, [])
+            found = by_status if found is None else sorted(set(found) & set(by_status))
+        return found
+
+class RunLog:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    def log_event(self, time, action, status, details):
+        m = _row_re.match(action or '')
+        self._ensure_writer()
+        event = {
+            'time': time,
+            'action': action,
+            'status': status,
+            'details': details,
+            'row': int(m.group(1)) if m else None,
+        }
+        self._queue.put(event)
+        events.publish('log', event)
+
+    def flush(self):
+        if self._writer:
+            self._queue.join()
+
+    def _ensure_writer(self):
+        if self._writer:
+            return
+        with self._start_lock:
+            if not self._writer:
+                self._writer = threading.Thread(target=self._write_loop, name="run-log-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append(batch)
+            except Exception as e:
+                logging.error(f"❌ Failed to write run log: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _append(self, events):
+        os.makedirs(LOG_DIR, exist_ok=True)
+        data = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in events).encode('utf-8')
+        # The lock file serialises rotation and appends across gunicorn workers
+        with open(os.path.join(LOG_DIR, '.runtime.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segments = list_segments()
+            seq = segments[-1][0] if segments else 1
+            path = _segment_path(seq)
+            if os.path.exists(path) and os.path.getsize(path) + len(data) > SEGMENT_MAX_BYTES:
+                seq += 1
+                path = _segment_path(seq)
+                segments.append((seq, path))
+            with open(path, 'ab') as f:
+                f.write(data)
+            if MAX_SEGMENTS and len(segments) > MAX_SEGMENTS:
+                for _, old in segments[:-MAX_SEGMENTS]:
+                    os.remove(old)
+                    if os.path.exists(_index_path(old)):
+                        os.remove(_index_path(old))
+
+    def stamp(self):
+        # Changes whenever any process appends or rotates; a stat call instead of reading the log
+        segments = list_segments()
+        if not segments:
+            return 'empty'
+        seq, path = segments[-1]
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return f"{seq}-gone"
+        return f"{seq}-{st.st_size}-{st.st_mtime_ns}"
+
+    def _index(self, path, active):
+        with self._index_lock:
+            index = self._indexes.get(path)
+            if index is None and not active:
+                index = SegmentIndex.load(path)
+            index = index or SegmentIndex()
+            size = index.size
+            index.update(path)
+            if not active and index.size != size:
+                index.save(path)
+            # Drop indexes of segments that were pruned
+            self._indexes = {p: i for p, i in self._indexes.items() if os.path.exists(p)}
+            self._indexes[path] = index
+            return index
+
+    def _indexed_lines(self, path, offsets):
+        with open(path, 'rb') as f:
+            for offset in reversed(offsets):
+                f.seek(offset)
+                yield f.readline()
+
+    def tail(self, limit=50, row=None, status=None, since=None, until=None):
+        # Walks segments newest to oldest and reads each one backwards, so cost is proportional
+        # to how far back the matches are rather than to the size of the log. Row and status filters
+        # go through the segment indexes and only read the lines that match.
+        status = status.lower() if status else None
+        matches = []
+        segments = list_segments()
+        for n, (_, path) in enumerate(reversed(segments)):
+            if until:
+                first = _first_time(path)
+                if first and first > until:
+                    continue
+            try:
+                if row is not None or status:
+                    lines = self._indexed_lines(path, self._index(path, active=n == 0).offsets(row, status))
+                else:
+                    lines = _reverse_lines(path)
+                for line in lines:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    t = event.get('time') or ''
+                    if until and t > until:
+                        continue
+                    if since and t < since:
+                        return list(reversed(matches))
+                    if row is not None and event.get('row') != row:
+                        continue
+                    if status and (event.get('status') or '').lower() != status:
+                        continue
+                    matches.append(event)
+                    if len(matches) >= limit:
+                        return list(reversed(matches))
+            except FileNotFoundError:
+                continue
+        return list(reversed(matches))
+
+run_log = RunLog()
+atexit.register(run_log.flush)
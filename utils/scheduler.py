@@ -1,9 +1,271 @@
+import heapq, logging, threading
+from datetime import datetime, timedelta, time as dtime
+from sqlalchemy.exc import IntegrityError
+from app import app, db
+from models import ScheduledPost
+from utils.run_log import run_log
+
+PUBLISH_MODES = ('future', 'release')
+ACTIVE_STATES = ('reserved', 'scheduled', 'released')
+LOOKAHEAD_DAYS = 366
+RELEASE_MAX_ATTEMPTS = 5
+# Slots closer than this are skipped so a post is saved before its slot comes up
+MIN_LEAD = timedelta(minutes=5)
+# A reservation never linked to a post (the process died between reserve and save) is freed after this
+RESERVATION_TTL = timedelta(hours=24)
+SWEEP_INTERVAL = timedelta(minutes=10)
+
+def parse_windows(spec):
+    # "08:00-12:00,14:00-18:00" -> [(480, 720), (840, 1080)], minutes after midnight
+    windows = []
+    for part in spec.split(','):
+        start, _, end = part.strip().partition('-')
+        start, end = _minutes(start), _minutes(end)
+        if not 0 <= start < end <= 24 * 60:
+            raise ValueError(f"Invalid publish window: {part}")
+        windows.append((start, end))
+    return sorted(windows)
+
+def _minutes(value):
+    hours, _, minutes = value.strip().partition(':')
+    return int(hours) * 60 + int(minutes or 0)
+
+def slot_grid(windows, per_day):
+    # per_day evenly spaced minute offsets across the windows, each centred in its share of the day
+    total = sum(end - start for start, end in windows)
+    step = total / per_day
+    grid = []
+    for k in range(per_day):
+        offset = (k + 0.5) * step
+        for start, end in windows:
+            if offset < end - start:
+                grid.append(int(start + offset))
+                break
+            offset -= end - start
+    return sorted(set(grid))
+
 class PublishScheduler:
+    # Hands out publish slots per site: evenly spread over the daily windows and capped per day and per hour.
+    # Slots live in the ScheduledPost table. In 'future' mode posts are saved with status=future and
+    # WordPress publishes them itself. In 'release' mode they are saved as drafts and a timer thread flips
+    # them to published when their slot comes up, a few at a time.
     def __init__(self, wordpress_api):
-        pass
+        self.wp = wordpress_api
+        self.site_url = wordpress_api.site_url
+        self.mode = app.config['PUBLISH_MODE'] if app.config['PUBLISH_MODE'] in PUBLISH_MODES else 'future'
+        self.windows = parse_windows(app.config['PUBLISH_WINDOWS'])
+        self.max_per_day = app.config['PUBLISH_MAX_PER_DAY']
+        self.max_per_hour = app.config['PUBLISH_MAX_PER_HOUR']
+        self.release_batch = app.config['PUBLISH_RELEASE_BATCH']
+        self.grid = slot_grid(self.windows, self.max_per_day)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._heap = []
+        self._thread = None
+        self._stopping = False
+        self._next_sweep = datetime.min
 
     def start(self):
-        pass
+        if self.mode != 'release' or self._thread:
+            return
+        with app.app_context():
+            pending = ScheduledPost.query.filter(
+                ScheduledPost.site_url == self.site_url,
+                ScheduledPost.state == 'scheduled',
+                ScheduledPost.wordpress_id.isnot(None),
+            ).all()
+        with self._cond:
+            for entry in pending:
+                heapq.heappush(self._heap, (entry.publish_at, entry.id, entry.publish_at))
+        self._thread = threading.Thread(target=self._run, name='publish-scheduler', daemon=True)
+        self._thread.start()
+        logging.info(f"🗓 Publish scheduler started for {self.site_url} ({len(pending)} posts waiting)")
 
     def stop(self):
-        pass
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def reserve(self, spreadsheet_id, sheet_name, row, title, day, previous=None):
+        # Returns (publish_at, status) for a row dated `day`. status is the WordPress status to save the
+        # post with, or None to let the publish date decide (future vs publish).
+        now = datetime.now()
+        with self._lock:
+            self._expire_reservations()
+            entry = ScheduledPost.query.filter_by(spreadsheet_id=spreadsheet_id, sheet_name=sheet_name, sheet_row=row).first()
+            if entry and entry.state in ACTIVE_STATES and entry.publish_at.date() == day:
+                return entry.publish_at, self._status(entry, now)
+
+            if day < now.date():
+                # Backdated rows are published straight away and don't use up a slot
+                if entry:
+                    db.session.delete(entry)
+                    db.session.commit()
+                return datetime.combine(day, dtime()) + timedelta(minutes=self.grid[0]), None
+
+            if not entry:
+                entry = ScheduledPost(site_url=self.site_url, spreadsheet_id=spreadsheet_id, sheet_name=sheet_name, sheet_row=row)
+
+            # A time WordPress already has for this post is kept when it falls on the same day
+            if previous and previous.date() == day and previous > now and self._save(entry, previous, title):
+                return entry.publish_at, self._status(entry, now)
+
+            for offset in range(LOOKAHEAD_DAYS):
+                candidate = day + timedelta(days=offset)
+                for slot in self._free_slots(candidate, now, exclude=entry.id):
+                    if self._save(entry, slot, title):
+                        if offset:
+                            logging.info(f"🗓 {day} is full, row {row} moved to {slot}")
+                        return entry.publish_at, self._status(entry, now)
+            raise RuntimeError(f"No free publish slot within {LOOKAHEAD_DAYS} days of {day}")
+
+    def release(self, spreadsheet_id, sheet_name, row):
+        # Frees the slot of a row whose post was never saved; a slot already linked to a post is kept
+        with self._lock:
+            freed = ScheduledPost.query.filter_by(spreadsheet_id=spreadsheet_id, sheet_name=sheet_name, sheet_row=row,
+                                                  state='reserved', wordpress_id=None).delete(synchronize_session=False)
+            db.session.commit()
+        return bool(freed)
+
+    def _expire_reservations(self):
+        if datetime.utcnow() < self._next_sweep:
+            return
+        self._next_sweep = datetime.utcnow() + SWEEP_INTERVAL
+        expired = ScheduledPost.query.filter(
+            ScheduledPost.site_url == self.site_url,
+            ScheduledPost.state == 'reserved',
+            ScheduledPost.wordpress_id.is_(None),
+            ScheduledPost.created_at < datetime.utcnow() - RESERVATION_TTL,
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if expired:
+            logging.info(f"🗓 Freed {expired} publish slot(s) reserved over {RESERVATION_TTL} ago without a post")
+
+    def attach(self, spreadsheet_id, sheet_name, row, post):
+        # Links a reserved slot to the saved post; in release mode drafts join the release queue
+        with self._lock:
+            entry = ScheduledPost.query.filter_by(spreadsheet_id=spreadsheet_id, sheet_name=sheet_name, sheet_row=row).first()
+            if not entry or entry.state not in ('reserved', 'scheduled'):
+                return
+            entry.wordpress_id = post.get('id')
+            entry.state = 'scheduled'
+            db.session.commit()
+            item = (entry.publish_at, entry.id, entry.publish_at)
+        if self.mode == 'release' and post.get('status') != 'publish':
+            with self._cond:
+                heapq.heappush(self._heap, item)
+                self._cond.notify()
+
+    def _status(self, entry, now):
+        if self.mode == 'release' and entry.state != 'released' and entry.publish_at > now:
+            return 'draft'
+        return None
+
+    def _save(self, entry, publish_at, title):
+        # Everything is set here because a failed commit expires the entry's pending changes
+        entry.title = title[:200]
+        entry.publish_at = publish_at
+        entry.state = 'reserved'
+        # Reservation time for entries without a post yet; see _expire_reservations
+        entry.created_at = datetime.utcnow()
+        entry.attempts = 0
+        entry.error = None
+        if entry.id is None:
+            db.session.add(entry)
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Another process took the slot first
+            db.session.rollback()
+            return False
+
+    def _free_slots(self, day, now, exclude=None):
+        start = datetime.combine(day, dtime())
+        taken = ScheduledPost.query.filter(
+            ScheduledPost.site_url == self.site_url,
+            ScheduledPost.state.in_(ACTIVE_STATES),
+            ScheduledPost.publish_at >= start,
+            ScheduledPost.publish_at < start + timedelta(days=1),
+            ScheduledPost.id != (exclude or 0),
+        ).with_entities(ScheduledPost.publish_at).all()
+        taken = [int((t.publish_at - start).total_seconds() // 60) for t in taken]
+        if len(taken) >= self.max_per_day:
+            return []
+
+        per_hour = {}
+        for minute in taken:
+            per_hour[minute // 60] = per_hour.get(minute // 60, 0) + 1
+        earliest = (now + MIN_LEAD - start).total_seconds() / 60
+        free = [m for m in self.grid
+                if m >= earliest and m not in taken and per_hour.get(m // 60, 0) < self.max_per_hour]
+        # Farthest from what is already booked first, so a part-filled day stays evenly spread
+        free.sort(key=lambda m: (-min((abs(m - t) for t in taken), default=0), m))
+        return [start + timedelta(minutes=m) for m in free]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not (self._heap and self._heap[0][0] <= datetime.now()):
+                    timeout = (self._heap[0][0] - datetime.now()).total_seconds() if self._heap else None
+                    # Capped so a wall-clock change can't leave the thread asleep past a slot
+                    self._cond.wait(min(timeout, 3600) if timeout is not None else 3600)
+                if self._stopping:
+                    return
+                due = []
+                while self._heap and self._heap[0][0] <= datetime.now() and len(due) < self.release_batch:
+                    due.append(heapq.heappop(self._heap))
+            try:
+                with app.app_context():
+                    self._release(due)
+            except Exception as e:
+                logging.error(f"❌ Publish release failed: {str(e)}")
+                with self._cond:
+                    for _, entry_id, publish_at in due:
+                        heapq.heappush(self._heap, (datetime.now() + timedelta(minutes=1), entry_id, publish_at))
+
+    def _release(self, due):
+        wanted = {entry_id: publish_at for _, entry_id, publish_at in due}
+        entries = [e for e in ScheduledPost.query.filter(ScheduledPost.id.in_(list(wanted))).all()
+                   # Rows re-dated or already released since they were queued are stale heap items
+                   if e.state == 'scheduled' and e.wordpress_id and e.publish_at == wanted[e.id]]
+        if not entries:
+            return
+        results = self.wp.publish_posts([(e.wordpress_id, e.publish_at) for e in entries])
+        retry = []
+        for entry, ok in zip(entries, results):
+            if ok:
+                entry.state = 'released'
+                entry.released_at = datetime.utcnow()
+                run_log.log_event(datetime.now().isoformat(), f"Row {entry.sheet_row}", "Success",
+                                  f"Released post {entry.wordpress_id} scheduled for {entry.publish_at}")
+                continue
+            entry.attempts = (entry.attempts or 0) + 1
+            if entry.attempts >= RELEASE_MAX_ATTEMPTS:
+                entry.state = 'failed'
+                entry.error = f"Publishing failed {entry.attempts} times"
+                run_log.log_event(datetime.now().isoformat(), f"Row {entry.sheet_row}", "Error",
+                                  f"Post {entry.wordpress_id} could not be released: {entry.error}")
+            else:
+                retry.append((datetime.now() + timedelta(minutes=2 ** entry.attempts), entry.id, entry.publish_at))
+        db.session.commit()
+        logging.info(f"🗓 Released {sum(1 for ok in results if ok)}/{len(entries)} scheduled posts")
+        if retry:
+            with self._cond:
+                for item in retry:
+                    heapq.heappush(self._heap, item)
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def scheduler_for(wp):
+    # One scheduler (and release thread) per WordPress site
+    with _schedulers_lock:
+        scheduler = _schedulers.get(wp.site_url)
+        if scheduler is None:
+            scheduler = _schedulers[wp.site_url] = PublishScheduler(wp)
+            scheduler.start()
+    return scheduler
@@ -0,0 +1,71 @@
+import hashlib, json
+from datetime import datetime
+from app import db
+from models import Article
+
+# Columns the processor writes back itself; they must not make a row look changed
+OUTPUT_COLUMNS = ('סטטוס', 'POST URL')
+
+def row_fingerprint(data):
+    payload = {k: v.strip() if isinstance(v, str) else v for k, v in data.items() if k not in OUTPUT_COLUMNS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class SyncState:
+    def __init__(self, spreadsheet_id, sheet_name):
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+
+    def load(self, rows):
+        if not rows:
+            return {}
+        articles = Article.query.filter(
+            Article.spreadsheet_id == self.spreadsheet_id,
+            Article.sheet_name == self.sheet_name,
+            Article.sheet_row.between(min(rows), max(rows)),
+        ).all()
+        return {a.sheet_row: a for a in articles}
+
+    def find_by_docs(self, doc_ids):
+        # Records for these docs anywhere in the tab, so a row that moved (a row inserted or deleted above it)
+        # is still matched to its post; the most recently updated record wins
+        if not doc_ids:
+            return {}
+        articles = Article.query.filter(
+            Article.spreadsheet_id == self.spreadsheet_id,
+            Article.sheet_name == self.sheet_name,
+            Article.doc_id.in_(list(doc_ids)),
+            Article.wordpress_id.isnot(None),
+        ).order_by(Article.updated_at).all()
+        return {a.doc_id: a for a in articles}
+
+    @staticmethod
+    def snapshot(article):
+        # Plain copy of a record, safe to keep while other records are rewritten
+        return {k: getattr(article, k) for k in ('title', 'doc_id', 'doc_revision', 'fingerprint', 'wordpress_id',
+                                                 'post_url', 'status', 'featured_media_id', 'scheduled_date')}
+
+    def relocate(self, row, source):
+        # Copies a moved row's record (a snapshot) to the row it is on now
+        post = {'id': source['wordpress_id'], 'link': source['post_url'], 'status': source['status']}
+        return self.record(row, source['title'], source['doc_id'], source['doc_revision'], source['fingerprint'], post,
+                           source['featured_media_id'], source['scheduled_date'])
+
+    def record(self, row, title, doc_id, doc_revision, fingerprint, post, media_id=None, date=None):
+        article = Article.query.filter_by(spreadsheet_id=self.spreadsheet_id, sheet_name=self.sheet_name, sheet_row=row).first()
+        if not article:
+            article = Article(spreadsheet_id=self.spreadsheet_id, sheet_name=self.sheet_name, sheet_row=row)
+            db.session.add(article)
+        article.title = title[:200]
+        article.doc_id = doc_id
+        article.doc_revision = doc_revision
+        article.fingerprint = fingerprint
+        article.wordpress_id = post.get('id')
+        article.post_url = post.get('link')
+        article.status = post.get('status') or article.status
+        if media_id:
+            article.featured_media_id = media_id
+        if date:
+            article.scheduled_date = date
+        article.updated_at = datetime.utcnow()
+        db.session.commit()
+        return article
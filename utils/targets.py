@@ -0,0 +1,101 @@
+import json, logging, os, threading
+from urllib.parse import urlparse
+from utils.rate_limit import limiter
+
+class Target:
+    # One tab-to-site mapping: which sheet tab to read, which WordPress site to publish it to, and how many
+    # Google and WordPress calls it may have in flight. The slots are shared by every run of the target in
+    # this process, so two shards of the same tab don't double its concurrency.
+    def __init__(self, name, spreadsheet_id, tab, wp_api_url, wp_user, wp_key, google_workers, wp_workers, wp_rate=None):
+        self.name = name
+        self.spreadsheet_id = spreadsheet_id
+        self.tab = tab
+        self.wp_api_url = wp_api_url
+        self.wp_user = wp_user
+        self.wp_key = wp_key
+        self.google_workers = google_workers
+        self.wp_workers = wp_workers
+        self.wp_rate = wp_rate
+        self.google_slots = threading.BoundedSemaphore(google_workers)
+        self.wp_slots = threading.BoundedSemaphore(wp_workers)
+
+    @classmethod
+    def default(cls, config):
+        # The single sheet and site from GOOGLE_SHEETS_ID / WP_API_URL; without GOOGLE_SHEET_NAME the first tab is read
+        return cls('default', config['GOOGLE_SHEETS_ID'], config.get('GOOGLE_SHEET_NAME'), config['WP_API_URL'],
+                   config['WP_API_USER'], config['WP_API_KEY'], config['GOOGLE_MAX_WORKERS'], config['WP_MAX_WORKERS'])
+
+    @classmethod
+    def from_dict(cls, entry, config):
+        tab = entry.get('tab')
+        wp_api_url = entry.get('wp_api_url')
+        if not tab or not wp_api_url:
+            raise ValueError(f"Fan-out target needs 'tab' and 'wp_api_url': {entry}")
+        key = os.environ.get(entry['wp_key_env']) if entry.get('wp_key_env') else entry.get('wp_key')
+        return cls(entry.get('name') or tab,
+                   entry.get('spreadsheet_id') or config['GOOGLE_SHEETS_ID'],
+                   tab,
+                   wp_api_url,
+                   entry.get('wp_user') or config['WP_API_USER'],
+                   key or config['WP_API_KEY'],
+                   int(entry.get('google_workers') or config['GOOGLE_MAX_WORKERS']),
+                   int(entry.get('wp_workers') or config['WP_MAX_WORKERS']),
+                   float(entry['wp_rate']) if entry.get('wp_rate') else None)
+
+    @property
+    def host(self):
+        return urlparse(self.wp_api_url).netloc
+
+    def apply_limits(self):
+        # A per-target WordPress rate replaces RATE_WORDPRESS for that site's bucket
+        if self.wp_rate:
+            limiter.bucket('wordpress', self.host).configure(self.wp_rate)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'spreadsheet_id': self.spreadsheet_id,
+            'tab': self.tab,
+            'site': self.wp_api_url,
+            'google_workers': self.google_workers,
+            'wp_workers': self.wp_workers,
+            'wp_rate': self.wp_rate,
+        }
+
+def conflicting_target(config, target, sheet_title):
+    # A fan-out target that reads the same tab for another site; the default target's tab is only
+    # known once its title has been fetched, so this is checked per run rather than at load time
+    for other in load_targets(config).values():
+        if (other.name != target.name and other.spreadsheet_id == target.spreadsheet_id
+                and other.tab == sheet_title and other.wp_api_url != target.wp_api_url):
+            return other
+    return None
+
+_targets = None
+_targets_lock = threading.Lock()
+
+def load_targets(config):
+    # FANOUT_TARGETS is a JSON list of {"name", "tab", "wp_api_url", "wp_user", "wp_key" or "wp_key_env",
+    # "spreadsheet_id", "google_workers", "wp_workers", "wp_rate"}; anything left out comes from the
+    # single-site settings. Parsed once per process so the targets' slots stay shared.
+    global _targets
+    with _targets_lock:
+        if _targets is None:
+            entries = json.loads(config['FANOUT_TARGETS']) if config['FANOUT_TARGETS'] else []
+            targets = {}
+            tabs = {}
+            for entry in entries:
+                target = Target.from_dict(entry, config)
+                if target.name in targets:
+                    raise ValueError(f"Duplicate fan-out target name: {target.name}")
+                # Sync state and publish slots are keyed by sheet row, not by site, so a tab has one target
+                other = tabs.setdefault((target.spreadsheet_id, target.tab), target.name)
+                if other != target.name:
+                    raise ValueError(f"Fan-out targets {other} and {target.name} both read tab {target.tab}")
+                target.apply_limits()
+                targets[target.name] = target
+            if targets:
+                logging.info(f"🎯 {len(targets)} fan-out target(s): " +
+                             ', '.join(f"{t.name} ({t.tab} -> {t.host})" for t in targets.values()))
+            _targets = targets
+    return _targets
@@ -1,12 +1,83 @@
 import requests
 import logging
+import os
+import random
+import threading
+import time
+import uuid
 from base64 import b64encode
 from datetime import datetime
+from io import BytesIO
 import re
-from urllib.parse import quote
+from urllib.parse import quote, urlparse
+from requests.adapters import HTTPAdapter
+from utils.rate_limit import limiter, parse_retry_after, THROTTLE_STATUSES
+from utils.metrics import metrics
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BATCH_MAX_REQUESTS = 25
+MEDIA_CAPTION = "Credit Canva.com"
+# Errors from a media endpoint that didn't find the file in a multipart body; any other 400 is about the file itself
+MULTIPART_UNSUPPORTED_CODES = {'rest_upload_no_data', 'rest_upload_no_content_type'}
+
+class MultipartStream:
+    # multipart/form-data body that streams the file part instead of loading it into memory
+    # (requests' own files= encoder reads the whole file first)
+    def __init__(self, fields, file_field, filename, fileobj, content_type):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        head = b''.join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode('utf-8') +
+            str(value).encode('utf-8') + b'\r\n'
+            for name, value in fields.items()
+        )
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                 f'Content-Type: {content_type}\r\n\r\n').encode('utf-8')
+        tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+
+        self._file = fileobj
+        self._file_start = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        file_size = fileobj.tell() - self._file_start
+        fileobj.seek(self._file_start)
+        self._parts = [(0, head), (len(head), None), (len(head) + file_size, tail)]
+        self._length = len(head) + file_size + len(tail)
+        self._pos = 0
+
+    def __len__(self):
+        return self._length
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: self._length}[whence]
+        self._pos = max(0, min(self._length, base + offset))
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length - self._pos
+        out = []
+        while size > 0 and self._pos < self._length:
+            index = max(i for i, (start, _) in enumerate(self._parts) if start <= self._pos)
+            start, data = self._parts[index]
+            end = self._parts[index + 1][0] if index + 1 < len(self._parts) else self._length
+            n = min(size, end - self._pos)
+            if data is None:
+                self._file.seek(self._file_start + self._pos - start)
+                chunk = self._file.read(n)
+                if not chunk:
+                    break
+            else:
+                chunk = data[self._pos - start:self._pos - start + n]
+            out.append(chunk)
+            self._pos += len(chunk)
+            size -= len(chunk)
+        return b''.join(out)
 
 class WordPressAPI:
-    def __init__(self, api_url, username, api_key):
+    def __init__(self, api_url, username, api_key, pool_size=10, max_retries=4, backoff_base=1.0, backoff_max=30, timeout=30):
         self.api_url = api_url.rstrip('/')
         self.site_url = self.api_url.replace('/wp-json/wp/v2', '')
         self.auth = b64encode(f"{username}:{api_key}".encode()).decode('ascii')
@@ -14,6 +85,75 @@ class WordPressAPI:
             'Authorization': f'Basic {self.auth}',
             'Content-Type': 'application/json'
         }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = (5, timeout)
+        self.rest_base = '/' + self.api_url.split('/wp-json/', 1)[-1] if '/wp-json/' in self.api_url else '/wp/v2'
+        self.batch_url = f"{self.site_url}/wp-json/batch/v1"
+        self.multipart_media = True
+        self._batch_supported = None
+        self._pending_meta = []
+        self._meta_lock = threading.Lock()
+        # Shared with every other client for the same host, so the site sees one combined request rate
+        self.limit = limiter.bucket('wordpress', urlparse(self.site_url).netloc)
+
+        # One keep-alive pool per host, sized for the number of concurrent WordPress workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, res):
+        return parse_retry_after(res.headers.get('Retry-After'))
+
+    def _record(self, res):
+        metrics.record_http('wordpress', res.status_code, int(res.request.headers.get('Content-Length') or 0), len(res.content))
+
+    def _request(self, method, url, before_retry=None, retries=None, **kwargs):
+        # Retries connection errors and 429/5xx with jittered exponential backoff, honouring Retry-After.
+        # before_retry lets non-idempotent callers check whether the failed attempt actually went through;
+        # if it returns something, that is returned instead of retrying. retries=0 sends exactly once.
+        max_retries = self.max_retries if retries is None else retries
+        body = kwargs.get('data')
+        body_pos = body.tell() if hasattr(body, 'seek') else None
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(max_retries + 1):
+            self.limit.acquire()
+            try:
+                res = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.record_http('wordpress', 'error')
+                if attempt == max_retries:
+                    raise
+                reason, delay = str(e), self._backoff(attempt)
+            else:
+                self._record(res)
+                retry_after = self._retry_after(res)
+                if res.status_code in THROTTLE_STATUSES:
+                    self.limit.throttle(retry_after)
+                elif res.status_code < 500:
+                    self.limit.success()
+                if res.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    return res
+                reason = f"HTTP {res.status_code}"
+                delay = retry_after
+                if delay is None:
+                    delay = self._backoff(attempt)
+
+            logging.warning(f"🔁 {method} {url} failed ({reason}), retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            metrics.record_retry('wordpress')
+            time.sleep(delay)
+            if before_retry:
+                recovered = before_retry()
+                if recovered:
+                    return recovered
+            if body_pos is not None:
+                body.seek(body_pos)
 
     def _generate_slug(self, title):
         slug = title.strip().lower()
@@ -21,10 +161,25 @@ class WordPressAPI:
         slug = re.sub(r'[^\w\-א-ת]', '', slug)
         return quote(slug)
 
-    def create_post(self, title, content, category_id=None, featured_media_id=None, date=None):
-        endpoint = f"{self.api_url}/posts"
+    def find_post_by_slug(self, slug):
+        try:
+            self.limit.acquire()
+            res = self.session.get(f"{self.api_url}/posts", headers=self.headers, timeout=self.timeout, params={
+                'slug': slug,
+                'status': 'publish,future,draft,pending,private',
+                '_fields': 'id,slug,status,link',
+            })
+            self._record(res)
+            res.raise_for_status()
+            posts = res.json()
+            return posts[0] if posts else None
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"⚠️ Slug lookup failed for {slug}: {str(e)}")
+            return None
+
+    def _post_payload(self, title, content, category_id=None, featured_media_id=None, date=None, status=None):
         now = datetime.now(date.tzinfo) if date else datetime.now()
-        status = "future" if date and date > now else "publish"
+        status = status or ("future" if date and date > now else "publish")
         slug = self._generate_slug(title)
 
         data = {
@@ -39,12 +194,24 @@ class WordPressAPI:
             data['featured_media'] = featured_media_id
         if date:
             data['date'] = date.isoformat()
+        return data
+
+    def create_post(self, title, content, category_id=None, featured_media_id=None, date=None, status=None):
+        endpoint = f"{self.api_url}/posts"
+        data = self._post_payload(title, content, category_id, featured_media_id, date, status)
+        slug = data['slug']
 
         try:
-            logging.debug(f"📤 Creating post: {title} | Status: {status}")
-            res = requests.post(endpoint, json=data, headers=self.headers, timeout=10)
-            res.raise_for_status()
-            post = res.json()
+            logging.debug(f"📤 Creating post: {title} | Status: {data['status']}")
+            # A create that timed out may still have succeeded server-side; look for it before posting again
+            res = self._request('POST', endpoint, json=data, headers=self.headers,
+                                before_retry=lambda: self.find_post_by_slug(slug))
+            if isinstance(res, dict):
+                logging.info(f"♻️ Post '{slug}' already exists (id {res.get('id')}), not creating it again")
+                post = res
+            else:
+                res.raise_for_status()
+                post = res.json()
 
             post['link'] = f"{self.site_url}/{slug}/"
             return post
@@ -54,36 +221,238 @@ class WordPressAPI:
                 logging.error(f"Response content: {e.response.text}")
             return None
 
-    def upload_media(self, image_data, filename, title=None):
+    def update_post(self, post_id, title, content, category_id=None, featured_media_id=None, date=None, status=None):
+        data = self._post_payload(title, content, category_id, featured_media_id, date, status)
+        try:
+            logging.debug(f"📝 Updating post {post_id}: {title}")
+            res = self._request('POST', f"{self.api_url}/posts/{post_id}", json=data, headers=self.headers)
+            res.raise_for_status()
+            post = res.json()
+            post['link'] = f"{self.site_url}/{data['slug']}/"
+            return post
+        except requests.exceptions.RequestException as e:
+            logging.error(f"❌ Error updating post {post_id}: {str(e)}")
+            if hasattr(e, 'response') and e.response is not None:
+                logging.error(f"Response content: {e.response.text}")
+            return None
+
+    def save_posts(self, items):
+        # Bulk create/update. Each item holds create_post's keyword arguments plus an optional post_id
+        # (update instead of create). Returns one post dict or None per item, in input order.
+        if not items:
+            return []
+        if not self.supports_batch():
+            return [self._save_post(item) for item in items]
+
+        fields = ('title', 'content', 'category_id', 'featured_media_id', 'date', 'status')
+        payloads = [self._post_payload(**{k: item.get(k) for k in fields}) for item in items]
+        try:
+            # A batch that was applied but lost its response must not be resent blindly, or every create in it
+            # happens twice; the single-request fallback below checks each slug first instead
+            results = self.batch([{
+                'method': 'POST',
+                'path': f"{self.rest_base}/posts/{item['post_id']}" if item.get('post_id') else f"{self.rest_base}/posts",
+                'body': data,
+            } for item, data in zip(items, payloads)], retry=all(item.get('post_id') for item in items))
+        except requests.exceptions.RequestException as e:
+            # Part of the batch may have been applied before the failure, so creates check the slug first
+            logging.warning(f"⚠️ Batch post save failed, falling back to single requests: {str(e)}")
+            return [self._save_post(item, check_existing=True) for item in items]
+
+        posts = []
+        for item, data, result in zip(items, payloads, results):
+            if 200 <= result['status'] < 300 and isinstance(result['body'], dict):
+                post = result['body']
+                post['link'] = f"{self.site_url}/{data['slug']}/"
+                posts.append(post)
+            elif result['status'] in RETRY_STATUSES:
+                # Throttled or failed server-side: retried on its own, looking for the post before creating it
+                logging.warning(f"🔁 Post '{item.get('title')}' failed in batch (HTTP {result['status']}), retrying singly")
+                posts.append(self._save_post(item, check_existing=True))
+            else:
+                message = result['body'].get('message') if isinstance(result['body'], dict) else result['body']
+                logging.error(f"❌ Error saving post '{item.get('title')}' in batch (HTTP {result['status']}): {message}")
+                posts.append(None)
+        logging.info(f"✅ Saved {sum(1 for p in posts if p)}/{len(items)} posts via batch API")
+        return posts
+
+    def _save_post(self, item, check_existing=False):
+        kwargs = {k: item.get(k) for k in ('title', 'content', 'category_id', 'featured_media_id', 'date', 'status')}
+        if item.get('post_id'):
+            return self.update_post(item['post_id'], **kwargs)
+        if check_existing:
+            slug = self._generate_slug(kwargs['title'])
+            existing = self.find_post_by_slug(slug)
+            if existing:
+                existing['link'] = f"{self.site_url}/{slug}/"
+                return existing
+        return self.create_post(**kwargs)
+
+    def publish_posts(self, posts):
+        # Flips (post_id, date) pairs to published; returns one bool per pair, in input order.
+        # Publishing is idempotent, so after a failed batch every post is simply retried on its own.
+        if not posts:
+            return []
+        requests_list = [{
+            'method': 'POST',
+            'path': f"{self.rest_base}/posts/{post_id}",
+            'body': {'status': 'publish', 'date': date.isoformat()},
+        } for post_id, date in posts]
+        if self.supports_batch():
+            try:
+                return [200 <= result['status'] < 300 for result in self.batch(requests_list)]
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"⚠️ Batch publish failed, falling back to single requests: {str(e)}")
+
+        published = []
+        for (post_id, _), sub in zip(posts, requests_list):
+            try:
+                res = self._request('POST', f"{self.api_url}/posts/{post_id}", json=sub['body'], headers=self.headers)
+                res.raise_for_status()
+                published.append(True)
+            except requests.exceptions.RequestException as e:
+                logging.error(f"❌ Error publishing post {post_id}: {str(e)}")
+                published.append(False)
+        return published
+
+    def supports_batch(self):
+        # /batch/v1 exists from WordPress 5.6; an OPTIONS request is enough to find out. Only a clear answer
+        # is cached: after a timeout or a 5xx this call falls back to single requests and the next one asks again.
+        if self._batch_supported is None:
+            try:
+                res = self._request('OPTIONS', self.batch_url, headers=self.headers)
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"⚠️ Could not check for the WordPress batch API, retrying later: {str(e)}")
+                return False
+            if res.status_code == 200:
+                self._batch_supported = True
+            elif 400 <= res.status_code < 500 and res.status_code not in (408, 429):
+                self._batch_supported = False
+            else:
+                logging.warning(f"⚠️ Could not check for the WordPress batch API (HTTP {res.status_code}), retrying later")
+                return False
+            logging.info(f"ℹ️ WordPress batch API {'available' if self._batch_supported else 'not available'}")
+        return self._batch_supported
+
+    def batch(self, requests_list, retry=True):
+        # Sends up to BATCH_MAX_REQUESTS sub-requests per call; returns one {'status', 'body'} per input, in order.
+        # retry=False for non-idempotent batches: a failed call raises instead of being resent.
+        results = []
+        for start in range(0, len(requests_list), BATCH_MAX_REQUESTS):
+            chunk = requests_list[start:start + BATCH_MAX_REQUESTS]
+            res = self._request('POST', self.batch_url, json={'requests': chunk, 'validation': 'normal'}, headers=self.headers,
+                                retries=None if retry else 0)
+            res.raise_for_status()
+            responses = res.json().get('responses', [])
+            for i in range(len(chunk)):
+                sub = responses[i] if i < len(responses) else {}
+                results.append({'status': sub.get('status', 500), 'body': sub.get('body')})
+        return results
+
+    def _media_meta(self, title):
+        return {
+            'alt_text': title,
+            'description': title,
+            'caption': MEDIA_CAPTION
+        }
+
+    def upload_media(self, image_data, filename, title=None, content_type='image/jpeg'):
+        # image_data may be bytes or a seekable file object; file objects are streamed from their current position
         if not image_data or not filename:
             return None
 
         endpoint = f"{self.api_url}/media"
-        headers = {
-            'Authorization': f'Basic {self.auth}',
-            'Content-Disposition': f'attachment; filename={filename}',
-            'Content-Type': 'image/jpeg'
-        }
+        if isinstance(image_data, (bytes, bytearray)):
+            image_data = BytesIO(image_data)
 
         try:
-            logging.debug(f"🖼 Uploading media: {filename}")
-            res = requests.post(endpoint, data=image_data, headers=headers, timeout=10)
-            res.raise_for_status()
-            media = res.json()
-            media_id = media.get('id')
-
-            if title:
-                meta = {
-                    'alt_text': title,
-                    'description': title,
-                    'caption': "Credit Canva.com"
+            media = None
+            if title and self.multipart_media:
+                # Since WP 4.7 the media endpoint accepts its fields alongside a multipart file upload
+                logging.debug(f"🖼 Uploading media with metadata: {filename}")
+                start = image_data.tell()
+                body = MultipartStream(self._media_meta(title), 'file', filename, image_data, content_type)
+                res = self._request('POST', endpoint, data=body,
+                                    headers={'Authorization': f'Basic {self.auth}', 'Content-Type': body.content_type})
+                if self._multipart_unsupported(res):
+                    logging.warning(f"⚠️ Multipart media upload rejected ({res.status_code}), falling back to raw uploads")
+                    self.multipart_media = False
+                    image_data.seek(start)
+                else:
+                    res.raise_for_status()
+                    media = res.json()
+                    # alt_text comes back through sanitize_text_field: trimmed, whitespace collapsed, tags stripped
+                    if not media.get('alt_text'):
+                        logging.warning("⚠️ WordPress ignored multipart media fields, falling back to deferred meta updates")
+                        self.multipart_media = False
+                        self.queue_media_meta(media.get('id'), title)
+
+            if media is None:
+                logging.debug(f"🖼 Uploading media: {filename}")
+                headers = {
+                    'Authorization': f'Basic {self.auth}',
+                    'Content-Disposition': f'attachment; filename={filename}',
+                    'Content-Type': content_type
                 }
-                meta_res = requests.post(f"{self.api_url}/media/{media_id}", json=meta, headers=self.headers, timeout=10)
-                meta_res.raise_for_status()
+                res = self._request('POST', endpoint, data=image_data, headers=headers)
+                res.raise_for_status()
+                media = res.json()
+                if title:
+                    self.queue_media_meta(media.get('id'), title)
 
-            return media_id
+            return media.get('id')
         except requests.exceptions.RequestException as e:
             logging.error(f"❌ Error uploading media: {str(e)}")
             if hasattr(e, 'response') and e.response is not None:
                 logging.error(f"Response content: {e.response.text}")
             return None
+
+    def _multipart_unsupported(self, res):
+        if res.status_code == 415:
+            return True
+        if res.status_code != 400:
+            return False
+        try:
+            return res.json().get('code') in MULTIPART_UNSUPPORTED_CODES
+        except ValueError:
+            return False
+
+    def queue_media_meta(self, media_id, title):
+        with self._meta_lock:
+            self._pending_meta.append((media_id, self._media_meta(title)))
+
+    def flush_media_meta(self):
+        # Sends deferred alt/description/caption updates. One request each: core WordPress doesn't allow
+        # media routes in /batch/v1, so a batch would only come back as per-item errors.
+        # Returns the media IDs that could not be updated.
+        with self._meta_lock:
+            pending, self._pending_meta = self._pending_meta, []
+
+        failed = []
+        for media_id, meta in pending:
+            try:
+                res = self._request('POST', f"{self.api_url}/media/{media_id}", json=meta, headers=self.headers)
+                res.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"❌ Error updating media {media_id} metadata: {str(e)}")
+                failed.append(media_id)
+        return failed
+
+    def media_url(self, media_id):
+        res = self._request('GET', f"{self.api_url}/media/{media_id}", params={'_fields': 'source_url'},
+                            headers=self.headers)
+        res.raise_for_status()
+        return res.json().get('source_url')
+
+    def media_exists(self, media_id):
+        # True/False when WordPress answers, None when it can't be reached (callers should trust their cache)
+        try:
+            res = self._request('GET', f"{self.api_url}/media/{media_id}", params={'_fields': 'id'},
+                                headers=self.headers)
+            if res.status_code in (404, 410):
+                return False
+            res.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"⚠️ Could not verify media {media_id}: {str(e)}")
+            return None